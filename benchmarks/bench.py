@@ -0,0 +1,184 @@
+"""
+Benchmarks the scaling of the package with the number of nodes, measuring wall time and peak memory.
+
+Run the benchmarks and save the results as JSON::
+
+    python benchmarks/bench.py run --output before.json
+    python benchmarks/bench.py run --sizes 10 100 1000 --cases analytics solver --output after.json
+
+Compare two runs, which exits with status 1 if any case got slower than the threshold::
+
+    python benchmarks/bench.py compare before.json after.json --threshold 0.1
+"""
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+import networkx
+import numpy
+import scipy
+
+from cases import get_cases
+
+DEFAULT_SIZES = [10, 100, 500, 1000, 2000, 5000]
+
+
+def measure(case: Dict[str, Any], node_count: int, repeat: int, seed: int) -> Dict[str, Any]:
+    """
+    Measures one case for one node count. A first untimed run warms up caches and compiled functions.
+    The wall time is then measured over a number of runs, and the peak memory in one extra run with
+    tracemalloc, since tracing slows the run down.
+
+    :param case: The case, see cases.CASES.
+    :param node_count: The number of nodes.
+    :param repeat: The number of timed runs.
+    :param seed: The seed of the fixture.
+    :return: The times of each run in seconds, their minimum and median, and the peak memory in bytes.
+    """
+    state = case['setup'](node_count, seed)
+    case['run'](state)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        case['run'](state)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    case['run'](state)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'times': times,
+        'min': min(times),
+        'median': statistics.median(times),
+        'peak_memory': peak_memory,
+    }
+
+
+def run(sizes: List[int], names: List[str], repeat: int, seed: int) -> Dict[str, Any]:
+    """
+    Runs all cases for all node counts.
+
+    :return: The results, together with the versions and platform they were measured on.
+    """
+    results = []
+    for name, case in get_cases(names).items():
+        for node_count in sizes:
+            if node_count > case.get('max_nodes', node_count):
+                continue
+            result = measure(case, node_count, repeat, seed)
+            result.update({'case': name, 'nodes': node_count})
+            results.append(result)
+            print('{:<45} n={:<6} median {:>10.6f} s  peak {:>10.1f} MB'.format(
+                name, node_count, result['median'], result['peak_memory'] / 2 ** 20
+            ), file=sys.stderr)
+
+    return {
+        'meta': {
+            'created': datetime.datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'networkx': networkx.__version__,
+            'numpy': numpy.__version__,
+            'scipy': scipy.__version__,
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def compare(before: Dict[str, Any], after: Dict[str, Any], threshold: float,
+            memory_threshold: float = None, min_time: float = 0, statistic: str = 'min') -> List[Dict[str, Any]]:
+    """
+    Compares the cases that both runs have in common.
+
+    :param before: The results of the earlier run.
+    :param after: The results of the later run.
+    :param threshold: The largest allowed relative increase of the time, such as 0.1 for 10 %.
+    :param memory_threshold: The largest allowed relative increase of the peak memory. Defaults to not
+                             checking the memory.
+    :param min_time: Increases of the time smaller than this many seconds are ignored as noise.
+    :param statistic: The time to compare, either 'min' or 'median'. The minimum is the least affected by
+                      other load on the machine.
+    :return: The comparison of each case, with whether it regressed.
+    """
+    earlier = {(result['case'], result['nodes']): result for result in before['results']}
+    comparisons = []
+    for result in after['results']:
+        key = (result['case'], result['nodes'])
+        if key not in earlier:
+            continue
+        before_time, after_time = earlier[key][statistic], result[statistic]
+        before_memory, after_memory = earlier[key]['peak_memory'], result['peak_memory']
+        time_ratio = after_time / before_time if before_time > 0 else 1
+        memory_ratio = after_memory / before_memory if before_memory > 0 else 1
+        slower = time_ratio > 1 + threshold and after_time - before_time > min_time
+        regressed = slower or (memory_threshold is not None and memory_ratio > 1 + memory_threshold)
+        comparisons.append({
+            'case': key[0],
+            'nodes': key[1],
+            'time_ratio': time_ratio,
+            'memory_ratio': memory_ratio,
+            'regressed': regressed,
+        })
+    return comparisons
+
+
+def main(arguments: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmarks for extended_networkx_tools.')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    run_parser = commands.add_parser('run', help='Run the benchmarks.')
+    run_parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Node counts.')
+    run_parser.add_argument('--cases', nargs='+', help='Names or prefixes of the cases to run.')
+    run_parser.add_argument('--repeat', type=int, default=5, help='Timed runs for each case.')
+    run_parser.add_argument('--seed', type=int, default=0, help='Seed of the fixtures.')
+    run_parser.add_argument('--output', help='File to write the JSON results to, instead of stdout.')
+
+    compare_parser = commands.add_parser('compare', help='Compare two runs.')
+    compare_parser.add_argument('before', help='JSON results of the earlier run.')
+    compare_parser.add_argument('after', help='JSON results of the later run.')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='Allowed relative increase of the time.')
+    compare_parser.add_argument('--memory-threshold', type=float,
+                                help='Allowed relative increase of the peak memory.')
+    compare_parser.add_argument('--min-time', type=float, default=0.001,
+                                help='Increases of the time below this many seconds are ignored.')
+    compare_parser.add_argument('--statistic', choices=['min', 'median'], default='min',
+                                help='The time of each case to compare.')
+
+    arguments = parser.parse_args(arguments)
+    if arguments.command == 'run':
+        results = run(arguments.sizes, arguments.cases, arguments.repeat, arguments.seed)
+        if arguments.output is not None:
+            with open(arguments.output, 'w') as file:
+                json.dump(results, file, indent=2)
+        else:
+            json.dump(results, sys.stdout, indent=2)
+        return 0
+
+    with open(arguments.before) as file:
+        before = json.load(file)
+    with open(arguments.after) as file:
+        after = json.load(file)
+    comparisons = compare(before, after, arguments.threshold, arguments.memory_threshold,
+                          arguments.min_time, arguments.statistic)
+    for comparison in comparisons:
+        print('{:<45} n={:<6} time x{:<7.3f} memory x{:<7.3f} {}'.format(
+            comparison['case'], comparison['nodes'], comparison['time_ratio'], comparison['memory_ratio'],
+            'REGRESSED' if comparison['regressed'] else 'ok'
+        ))
+    return 1 if any(comparison['regressed'] for comparison in comparisons) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
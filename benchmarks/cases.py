@@ -0,0 +1,159 @@
+"""
+Seeded fixtures and benchmark cases.
+
+Each case has a setup function that builds its input for a node count, which isn't measured, and a run
+function that is measured. Cases that would take too long or use too much memory for large graphs have
+a largest node count.
+"""
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from extended_networkx_tools import Analytics, AnalyticsGraph, Creator, Solver
+
+
+def random_graph(node_count: int, degree: int = 4, seed: int = 0):
+    """
+    Creates a connected graph with nodes at random positions, a cycle through all nodes, and random
+    extra edges until the average degree is about the given one. The same arguments always give the
+    same graph.
+
+    :param node_count: The number of nodes.
+    :param degree: The average degree of the nodes.
+    :param seed: The seed of the graph.
+    :return: The graph.
+    """
+    rng = np.random.default_rng(seed)
+    nxg = Creator.from_random(node_count, seed=rng)
+    Solver.cycle(nxg)
+    extra = max(0, node_count * (degree - 2) // 2)
+    for origin, destination in rng.integers(0, node_count, (extra, 2)).tolist():
+        if origin != destination:
+            Creator.add_weighted_edge(nxg, origin, destination)
+    return nxg
+
+
+def random_moves(nxg, count: int, seed: int = 0) -> List:
+    """
+    Draws moves of one end of an edge to a node it isn't connected to.
+
+    :param nxg: The graph.
+    :param count: The number of moves.
+    :param seed: The seed of the moves.
+    :return: List of moves as (origin, old_destination, new_destination).
+    """
+    rng = np.random.default_rng(seed)
+    edges = [edge for edge in nxg.edges() if edge[0] != edge[1]]
+    moves = []
+    while len(moves) < count:
+        origin, old_destination = edges[rng.integers(len(edges))]
+        new_destination = int(rng.integers(nxg.number_of_nodes()))
+        if new_destination != origin and not nxg.has_edge(origin, new_destination):
+            moves.append((origin, old_destination, new_destination))
+    return moves
+
+
+def _setup_analytics_graph(node_count: int, seed: int, move_count: int = 10, **kwargs) -> Dict[str, Any]:
+    nxg = random_graph(node_count, seed=seed)
+    analytics_graph = AnalyticsGraph(nxg, **kwargs)
+    analytics_graph.get_convergence_rate()
+    return {'analytics_graph': analytics_graph, 'moves': random_moves(nxg, move_count, seed)}
+
+
+def _run_move_revert(state: Dict[str, Any]):
+    analytics_graph = state['analytics_graph']
+    for move in state['moves']:
+        analytics_graph.move_edge(*move)
+        analytics_graph.get_convergence_rate()
+        analytics_graph.revert()
+
+
+def _run_move_revert_algebraic_connectivity(state: Dict[str, Any]):
+    analytics_graph = state['analytics_graph']
+    for move in state['moves']:
+        analytics_graph.move_edge(*move)
+        analytics_graph.get_algebraic_connectivity()
+        analytics_graph.revert()
+
+
+def _setup_optimize(node_count: int, seed: int) -> Dict[str, Any]:
+    return {'nxg': random_graph(node_count, seed=seed), 'seed': seed}
+
+
+# Each case has a setup function of the node count and seed, a run function of what setup returns,
+# and optionally the largest node count to run it for
+CASES: Dict[str, Dict[str, Any]] = {
+    'creator.from_random': {
+        'setup': lambda node_count, seed: {'node_count': node_count, 'seed': seed},
+        'run': lambda state: Creator.from_random(state['node_count'], seed=state['seed']),
+    },
+    'analytics.get_adjacency_matrix': {
+        'setup': lambda node_count, seed: random_graph(node_count, seed=seed),
+        'run': lambda nxg: Analytics.get_adjacency_matrix(nxg),
+    },
+    'analytics.convergence_rate': {
+        'setup': lambda node_count, seed: random_graph(node_count, seed=seed),
+        'run': lambda nxg: Analytics.convergence_rate(nxg),
+        'max_nodes': 1000,
+    },
+    'analytics.convergence_rate_lanczos': {
+        'setup': lambda node_count, seed: random_graph(node_count, seed=seed),
+        'run': lambda nxg: Analytics.convergence_rate(nxg, lanczos=True),
+    },
+    'analytics.get_convergence_eigenpair': {
+        'setup': lambda node_count, seed: Analytics.get_adjacency_matrix(
+            random_graph(node_count, seed=seed), True, dtype=float, as_sparse=True
+        ),
+        'run': lambda adjacency_matrix: Analytics.get_convergence_eigenpair(adjacency_matrix),
+    },
+    'analytics.get_eccentricity_distribution': {
+        'setup': lambda node_count, seed: random_graph(node_count, seed=seed),
+        'run': lambda nxg: Analytics.get_eccentricity_distribution(nxg),
+        'max_nodes': 1000,
+    },
+    'solver.complete': {
+        'setup': lambda node_count, seed: Creator.from_random(node_count, seed=seed),
+        'run': lambda nxg: Solver.complete(nxg.copy()),
+        'max_nodes': 1000,
+    },
+    'analytics_graph.move_revert': {
+        'setup': _setup_analytics_graph,
+        'run': _run_move_revert,
+        'max_nodes': 500,
+    },
+    'analytics_graph.move_revert_warm_start': {
+        'setup': lambda node_count, seed: _setup_analytics_graph(
+            node_count, seed, sparse=True, warm_start=True
+        ),
+        'run': _run_move_revert,
+    },
+    'analytics_graph.move_revert_lanczos': {
+        'setup': lambda node_count, seed: _setup_analytics_graph(node_count, seed, sparse=True, lanczos=True),
+        'run': _run_move_revert,
+    },
+    'analytics_graph.move_revert_algebraic_connectivity': {
+        'setup': lambda node_count, seed: _setup_analytics_graph(node_count, seed, sparse=True),
+        'run': _run_move_revert_algebraic_connectivity,
+    },
+    # Batched dense scoring up to Analytics.dense_batch_limit nodes, and warm-started iterative scoring above
+    'analytics_graph.evaluate_moves': {
+        'setup': lambda node_count, seed: _setup_analytics_graph(
+            node_count, seed, move_count=32, sparse=True, warm_start=True
+        ),
+        'run': lambda state: state['analytics_graph'].evaluate_moves(state['moves']),
+    },
+    'solver.optimize': {
+        'setup': _setup_optimize,
+        'run': lambda state: Solver.optimize(state['nxg'].copy(), 'hill_climb', max_iterations=32, seed=state['seed']),
+    },
+}
+
+
+def get_cases(names: List[str] = None) -> Dict[str, Dict[str, Callable]]:
+    """
+    :param names: The names of the cases to get, or prefixes of them. Defaults to all cases.
+    :return: The cases by name.
+    """
+    if not names:
+        return CASES
+    return {name: case for name, case in CASES.items() if any(name.startswith(prefix) for prefix in names)}
@@ -0,0 +1,120 @@
+"""
+Benchmarks the time it takes to import the package in a new interpreter, and checks that slow dependencies
+that aren't needed, such as matplotlib and numba, aren't imported.
+
+Run the benchmarks and save the results as JSON, in the same format as bench.py so the runs can be
+compared with ``bench.py compare``::
+
+    python benchmarks/import_time.py --output before.json
+
+The run exits with status 1 if an import is slower than --max-time, or imports a deferred dependency.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each case is the import statement to time, and the dependencies it must not import
+CASES: Dict[str, Dict[str, Any]] = {
+    'import.package': {
+        'statement': 'import extended_networkx_tools',
+        'deferred': ['networkx', 'scipy', 'numba', 'matplotlib'],
+    },
+    'import.creator': {
+        'statement': 'from extended_networkx_tools import Creator',
+        'deferred': ['numba', 'matplotlib'],
+    },
+    'import.analytics_graph': {
+        'statement': 'from extended_networkx_tools import Creator, Analytics, AnalyticsGraph, Solver',
+        'deferred': ['numba', 'matplotlib'],
+    },
+    'import.all': {
+        'statement': 'from extended_networkx_tools import *',
+        'deferred': ['numba', 'matplotlib'],
+    },
+}
+
+_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'time': elapsed, 'modules': sorted(sys.modules)}}))
+'''
+
+
+def measure(statement: str, repeat: int) -> Dict[str, Any]:
+    """
+    Times an import statement in new interpreters.
+
+    :param statement: The import statement.
+    :param repeat: The number of interpreters to time it in.
+    :return: The times of each run in seconds, their minimum and median, and the imported modules.
+    """
+    times = []
+    modules = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', _SCRIPT.format(statement=statement)],
+            cwd=ROOT, stdout=subprocess.PIPE, check=True, universal_newlines=True
+        ).stdout
+        result = json.loads(output)
+        times.append(result['time'])
+        modules = result['modules']
+    return {'times': times, 'min': min(times), 'median': statistics.median(times), 'modules': modules}
+
+
+def run(names: List[str], repeat: int) -> Dict[str, Any]:
+    """
+    Runs all import cases.
+
+    :return: The results, and the deferred dependencies each case imported.
+    """
+    results = []
+    for name, case in CASES.items():
+        if names and not any(name.startswith(prefix) for prefix in names):
+            continue
+        result = measure(case['statement'], repeat)
+        modules = set(result.pop('modules'))
+        result.update({
+            'case': name,
+            'nodes': 0,
+            'peak_memory': 0,
+            'imported_deferred': [module for module in case['deferred'] if module in modules],
+        })
+        results.append(result)
+        print('{:<45} median {:>10.6f} s  {}'.format(
+            name, result['median'], ' '.join('imports ' + module for module in result['imported_deferred'])
+        ), file=sys.stderr)
+    return {'meta': {'python': sys.version.split()[0], 'repeat': repeat}, 'results': results}
+
+
+def main(arguments: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Import time benchmarks for extended_networkx_tools.')
+    parser.add_argument('--cases', nargs='+', help='Names or prefixes of the cases to run.')
+    parser.add_argument('--repeat', type=int, default=5, help='Interpreters to time each case in.')
+    parser.add_argument('--max-time', type=float, help='Largest allowed median time of each case in seconds.')
+    parser.add_argument('--output', help='File to write the JSON results to, instead of stdout.')
+    arguments = parser.parse_args(arguments)
+
+    results = run(arguments.cases, arguments.repeat)
+    if arguments.output is not None:
+        with open(arguments.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+
+    failed = any(
+        result['imported_deferred'] or (arguments.max_time is not None and result['median'] > arguments.max_time)
+        for result in results['results']
+    )
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,22 +1,47 @@
-import copy
+import functools
+import math
+import numbers
 import queue
-from typing import List, Dict, Tuple
+from itertools import combinations
+from typing import Any, Callable, List, Dict, Tuple, Union
 import warnings
 
 import networkx as nx
 import numpy as np
 from numpy import linalg
-
-import numba
-from numba import jit, prange
+from scipy import sparse
+from scipy.sparse import linalg as sparse_linalg
 
 try:
-    from Solver import Solver
+    from Instrumentation import Instrumentation
 except ImportError:
-    from .Solver import Solver
+    from .Instrumentation import Instrumentation
+
+
+def _jit(**options) -> Callable:
+    """
+    Like numba.jit, but numba is only imported and the function compiled on its first call, since
+    importing numba is slow.
+
+    :param options: The options of numba.jit.
+    """
+    def decorator(function: Callable) -> Callable:
+        compiled = []
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not compiled:
+                import numba
+                compiled.append(numba.jit(**options)(function))
+            return compiled[0](*args, **kwargs)
+        return wrapper
+    return decorator
 
 
 class Analytics:
+    # Graphs of up to this many nodes are scored by batched dense eigenvalue calculations, which are faster
+    # than the iterative solver for them. Set Analytics.dense_batch_limit to change it for the whole package.
+    dense_batch_limit: int = 200
 
     @staticmethod
     def get_neighbour_matrix(nxg: nx.Graph):
@@ -25,50 +50,127 @@ class Analytics:
         return Analytics.get_adjacency_matrix(nxg, True)
 
     @staticmethod
-    def get_adjacency_matrix(nxg: nx.Graph, self_assignment=False) -> List[List[int]]:
+    def get_node_index(nxg: nx.Graph) -> Dict[int, int]:
+        """
+        Creates a mapping from each node in the graph to its row/column index in the matrices
+        produced by this class, which is the position of the node in the sorted node list.
+
+        :param nxg: networkx graph object.
+        :type nxg: nx.Graph
+        :return: A dict mapping node id to matrix index.
+        :rtype: Dict[int, int]
+        """
+        return {node: index for index, node in enumerate(sorted(nxg.nodes()))}
+
+    @staticmethod
+    def get_edge_array(nxg: nx.Graph, node_index: Dict[int, int] = None) -> np.ndarray:
+        """
+        Creates an array of all edges in the graph, expressed as matrix indices rather than node ids.
+
+        :param nxg: networkx graph object.
+        :type nxg: nx.Graph
+        :param node_index: Optional precomputed mapping from node id to matrix index.
+        :type node_index: Dict[int, int]
+        :return: An array of shape (m, 2) where each row is the index pair of an edge.
+        :rtype: np.ndarray
+        """
+        if node_index is None:
+            node_index = Analytics.get_node_index(nxg)
+
+        edges = np.fromiter(
+            (node_index[node] for edge in nxg.edges() for node in edge),
+            dtype=np.intp,
+            count=2 * nxg.number_of_edges()
+        )
+        return edges.reshape(-1, 2)
+
+    @staticmethod
+    def get_coordinate_array(nxg: nx.Graph, node_index: Dict[int, int] = None) -> np.ndarray:
+        """
+        Creates an array of the coordinates of all nodes in the graph, ordered by matrix index.
+
+        :param nxg: networkx graph object with nodes containing coordinates.
+        :type nxg: nx.Graph
+        :param node_index: Optional precomputed mapping from node id to matrix index.
+        :type node_index: Dict[int, int]
+        :return: An array of shape (n, 2) where each row is the (x, y) coordinate of a node.
+        :rtype: np.ndarray
+        """
+        if node_index is None:
+            node_index = Analytics.get_node_index(nxg)
+
+        coordinates = [None] * len(node_index)
+        for node, data in nxg.nodes(data=True):
+            coordinates[node_index[node]] = (data['x'], data['y'])
+        return np.array(coordinates).reshape(-1, 2)
+
+    @staticmethod
+    @Instrumentation.timed('analytics.get_adjacency_matrix')
+    def get_adjacency_matrix(nxg: nx.Graph, self_assignment=False, dtype=int, as_list: bool = False,
+                             as_sparse: bool = False) -> Union[np.ndarray, List[List[int]], sparse.csr_matrix]:
         """
         Creates a neighbour matrix for a specified graph: g, each row represents a node in the graph
         where the values in each column represents if there is an edge or not between those nodes.
+        Rows and columns are ordered by the sorted node ids, see get_node_index().
 
         :param nxg: networkx bi-directional graph object.
         :type nxg: nx.Graph
         :param self_assignment: Whether or not to use self assignment in the graph. Used for convergence rate.
-        :type nxg: bool
-        :return A: List of rows, representing the adjacency matrix.
-        :rtype: List[List[float]]
-        """
-        # Sort the nodes in the graph
-        s_nodes = list(nxg.nodes())
-        s_nodes.sort()
+        :type self_assignment: bool
+        :param dtype: The data type of the matrix.
+        :param as_list: Whether to return the matrix as a list of rows instead of an array.
+        :type as_list: bool
+        :param as_sparse: Whether to return the matrix as a scipy CSR matrix instead of an array.
+        :type as_sparse: bool
+        :return A: The adjacency matrix.
+        :rtype: Union[np.ndarray, List[List[int]], sparse.csr_matrix]
+        """
+        node_index = Analytics.get_node_index(nxg)
+        edges = Analytics.get_edge_array(nxg, node_index)
         # Get the dimension of each row
-        dim = len(s_nodes)
+        dim = len(node_index)
 
-        mx = []
-        for node in nxg.nodes():
-            row = [0] * dim
-            # Get the index of the current node
-            node_index = s_nodes.index(node)
+        if as_sparse:
+            if not nxg.is_directed():
+                edges = np.concatenate((edges, edges[:, ::-1]))
             if self_assignment:
-                row[node_index] = 1
-            for neighbour in nxg.neighbors(node):
-                node_index = s_nodes.index(neighbour)
-                row[node_index] = 1
-            mx.append(row)
+                diagonal = np.arange(dim)
+                edges = np.concatenate((edges, np.column_stack((diagonal, diagonal))))
+            mx = sparse.csr_matrix((np.ones(len(edges), dtype=dtype), (edges[:, 0], edges[:, 1])), shape=(dim, dim))
+            # Duplicates from self loops in the graph are summed up, so reset them to 1
+            mx.sum_duplicates()
+            mx.data[:] = 1
+            return mx
+
+        mx = np.zeros((dim, dim), dtype=dtype)
+        mx[edges[:, 0], edges[:, 1]] = 1
+        if not nxg.is_directed():
+            mx[edges[:, 1], edges[:, 0]] = 1
+        if self_assignment:
+            np.fill_diagonal(mx, 1)
+
+        if as_list:
+            return mx.tolist()
         return mx
 
     @staticmethod
-    def get_stochastic_neighbour_matrix(nxg: nx.Graph = None, adjacency_matrix: List[List[int]] = None) -> List[List[float]]:
+    def get_stochastic_neighbour_matrix(nxg: nx.Graph = None, adjacency_matrix: List[List[int]] = None,
+                                        dtype=float, as_list: bool = False) -> Union[np.ndarray, List[List[float]]]:
         """
         Creates a stochastic adjacency matrix for a specified graph: g, each row represents a node in the graph
         where the values in each column represents if there is an edge or not between those nodes.
         The values for each neighbour is represented by 1/(number of neighbours), if no edge exists this value is 0.
+        A sparse adjacency matrix yields a sparse stochastic matrix in CSR format.
 
         :param nxg: Networkx bi-directional graph object.
         :type nxg: nx.Graph
         :param adjacency_matrix: Self assigned adjacency matrix.
-        :type adjacency_matrix: List[List[int]]
-        :return A: List of rows, representing the adjacency matrix.
-        :rtype: List[List[float]]
+        :type adjacency_matrix: Union[np.ndarray, List[List[int]], sparse.spmatrix]
+        :param dtype: The data type of the matrix.
+        :param as_list: Whether to return the matrix as a list of rows instead of an array.
+        :type as_list: bool
+        :return A: The stochastic adjacency matrix.
+        :rtype: Union[np.ndarray, List[List[float]]]
         """
         if nxg is None and adjacency_matrix is None:
             raise ValueError('At least one parameter of nxg or adjacency_matrix needs to be provided')
@@ -76,37 +178,197 @@ class Analytics:
         # If we wasn't provided with the adjacency matrix, get it.
         if adjacency_matrix is None:
             # Get the adjacency matrix
-            adjacency_matrix = Analytics.get_adjacency_matrix(nxg, True)
+            adjacency_matrix = Analytics.get_adjacency_matrix(nxg, True, dtype=dtype)
+
+        if sparse.issparse(adjacency_matrix):
+            mx = sparse.csr_matrix(adjacency_matrix, dtype=dtype)
+            # Scale each row with the inverse of the sum of the row
+            mx = (sparse.diags(1 / np.asarray(mx.sum(axis=1)).ravel()) @ mx).tocsr()
+            if as_list:
+                return mx.toarray().tolist()
+            return mx
+
+        mx = np.array(adjacency_matrix, dtype=dtype)
+        # Divide each row with the sum of the row
+        mx /= mx.sum(axis=1, keepdims=True)
+
+        if as_list:
+            return mx.tolist()
+        return mx
 
-        mx = []
+    @staticmethod
+    def get_symmetric_stochastic_matrix(nxg: nx.Graph = None, adjacency_matrix: List[List[int]] = None,
+                                        dtype=float) -> Union[np.ndarray, sparse.csr_matrix]:
+        """
+        Creates the symmetric matrix D^-1/2 * A * D^-1/2, where A is the self assigned adjacency matrix and D
+        its diagonal degree matrix. It is similar to the stochastic neighbour matrix D^-1 * A, so both have
+        the same eigenvalues, but being symmetric lets faster eigenvalue solvers be used on it.
+        A sparse adjacency matrix yields a sparse matrix in CSR format.
+
+        :param nxg: Networkx bi-directional graph object.
+        :type nxg: nx.Graph
+        :param adjacency_matrix: Self assigned adjacency matrix.
+        :type adjacency_matrix: Union[np.ndarray, List[List[int]], sparse.spmatrix]
+        :param dtype: The data type of the matrix.
+        :return: The symmetric stochastic matrix.
+        :rtype: Union[np.ndarray, sparse.csr_matrix]
+        """
+        if nxg is None and adjacency_matrix is None:
+            raise ValueError('At least one parameter of nxg or adjacency_matrix needs to be provided')
+
+        if adjacency_matrix is None:
+            adjacency_matrix = Analytics.get_adjacency_matrix(nxg, True, dtype=dtype, as_sparse=True)
+        if sparse.issparse(adjacency_matrix):
+            mx = sparse.csr_matrix(adjacency_matrix, dtype=dtype)
+            scale = 1 / np.sqrt(np.asarray(mx.sum(axis=1)).ravel())
+        else:
+            mx = np.array(adjacency_matrix, dtype=dtype)
+            scale = 1 / np.sqrt(mx.sum(axis=1))
 
-        # Iterate over each row
-        for row_id, _ in enumerate(adjacency_matrix):
-            # Calculate the sum for each row
-            row_sum = sum(adjacency_matrix[row_id])
-            # Divide each node in the row with the sum of the row
-            mx.append(list(map(lambda x: (x / row_sum), adjacency_matrix[row_id])))
+        return Analytics._scale_matrix(mx, scale, scale)
 
-        # Working solution that might however be worse than the previous solution.
-        # mx = list(map(lambda row: list(map(lambda cell: cell / sum(row), row)), mx))
+    @staticmethod
+    def _scale_matrix(mx, row_scale: np.ndarray, col_scale: np.ndarray):
+        """
+        Calculates diag(row_scale) * mx * diag(col_scale) for a dense or sparse matrix.
 
-        return mx
+        :param mx: A numpy array or a scipy sparse matrix.
+        :param row_scale: The factor to multiply each row with.
+        :param col_scale: The factor to multiply each column with.
+        :return: The scaled matrix, in CSR format if mx is sparse.
+        """
+        if sparse.issparse(mx):
+            return (sparse.diags(row_scale) @ mx @ sparse.diags(col_scale)).tocsr()
+        return mx * row_scale[:, np.newaxis] * col_scale[np.newaxis, :]
 
     @staticmethod
-    def get_eigenvalues(mx: List[List[float]], symmetrical: bool = False) -> np.ndarray:
+    @Instrumentation.timed('analytics.get_eigenvalues')
+    def get_eigenvalues(mx: List[List[float]], symmetrical: bool = False, k: int = None,
+                        tol: float = 0) -> np.ndarray:
         """
         Simple function to retrieve the eigenvalues of a matrix.
+        If k is given, only the k largest eigenvalues are computed, with an iterative solver for sparse matrices.
+        Otherwise sparse matrices are converted to dense ones, to compute all eigenvalues.
 
-        :param mx: A matrix made up of nested lists.
+        :param mx: A matrix made up of nested lists, a numpy array or a scipy sparse matrix.
         :param symmetrical: Whether or not the matrix is symmetrical. If tru it can make faster computations.
-        :return: List of eigenvalues of the provided matrix.
+        :param k: If given, only the k largest (real) eigenvalues are returned.
+        :param tol: Relative accuracy of the k largest eigenvalues, where 0 means machine precision.
+        :return: List of eigenvalues of the provided matrix. The k largest are sorted in ascending order.
         :rtype: List[float]
         """
+        if k is not None:
+            return Analytics._get_largest_eigenvalues(mx, k, symmetrical, tol)
+        if sparse.issparse(mx):
+            mx = mx.toarray()
+
         if symmetrical:
             return linalg.eigvalsh(mx)
         else:
             return np.real(linalg.eigvals(mx))
 
+    @staticmethod
+    @Instrumentation.timed('analytics.get_largest_eigenvalues')
+    def _get_largest_eigenvalues(mx, k: int, symmetrical: bool, tol: float = 0) -> np.ndarray:
+        """
+        Computes the k largest eigenvalues of a matrix, in ascending order. The iterative solvers
+        can't return all eigenvalues, so small matrices fall back to a dense solver.
+
+        :param mx: A numpy array or a scipy sparse matrix.
+        :param k: The number of eigenvalues to compute.
+        :param symmetrical: Whether or not the matrix is symmetrical.
+        :param tol: Relative accuracy of the eigenvalues, where 0 means machine precision.
+        :return: The k largest eigenvalues.
+        """
+        dimension = mx.shape[0]
+        if k >= dimension - 1:
+            if sparse.issparse(mx):
+                mx = mx.toarray()
+            return np.sort(Analytics.get_eigenvalues(mx, symmetrical))[-k:]
+
+        if symmetrical:
+            ev = sparse_linalg.eigsh(mx, k=k, which='LA', tol=tol, return_eigenvectors=False)
+        else:
+            ev = np.real(sparse_linalg.eigs(mx, k=k, which='LR', tol=tol, return_eigenvectors=False))
+        return np.sort(ev)
+
+    @staticmethod
+    @Instrumentation.timed('analytics.get_eigenpairs')
+    def get_eigenpairs(mx, k: int = 1, largest: bool = True, x0: np.ndarray = None,
+                       constraints: np.ndarray = None, tol: float = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Calculates the k largest or smallest eigenvalues of a symmetric matrix together with their
+        eigenvectors, using the iterative Lanczos method (ARPACK). Given a good starting guess, such as an
+        eigenvector of a slightly different matrix, it needs fewer iterations to converge. Matrices of up to
+        64 rows, or 128 rows without a starting guess, are solved densely, which is faster for them.
+
+        :param mx: A symmetric numpy array or scipy sparse matrix.
+        :param k: The number of eigenpairs to calculate.
+        :param largest: Whether to calculate the largest or the smallest eigenpairs.
+        :param x0: Starting guess of the eigenvectors, with shape (n, k), of which the first is used to start
+                   the solver. Random if not provided.
+        :param constraints: Known eigenvectors, with shape (n, c), to exclude from the search.
+        :param tol: Relative accuracy of the eigenvalues, where 0 means machine precision. The solver stops once
+                    the residual of each eigenpair is below tol times its eigenvalue.
+        :return: The eigenvalues, ordered from the most extreme, and the eigenvectors as columns.
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        dimension = mx.shape[0]
+        if constraints is not None:
+            # Orthonormalize the constraints so they can be projected away
+            constraints, _ = linalg.qr(np.asarray(constraints, dtype=float).reshape(dimension, -1))
+            constraint_count = constraints.shape[1]
+        else:
+            constraint_count = 0
+
+        warm = x0 is not None and x0.shape == (dimension, k)
+        if dimension <= max(64 if warm else 128, 5 * (k + constraint_count)):
+            return Analytics._get_dense_eigenpairs(mx, k, largest, constraints)
+
+        if not warm:
+            x0 = np.random.RandomState(0).normal(size=(dimension, k))
+
+        operator = mx
+        if constraints is not None:
+            # Move the eigenvalues of the constraints to the other end of the spectrum, which is bounded by the
+            # largest absolute row sum, so the solver doesn't find them
+            bound = abs(mx).sum(axis=1).max()
+            shifts = np.einsum('ij,ij->j', constraints, mx @ constraints) + (bound if largest else -bound)
+
+            def matvec(x):
+                x = np.ravel(x)
+                return mx @ x - constraints @ (shifts * (constraints.T @ x))
+
+            operator = sparse_linalg.LinearOperator((dimension, dimension), matvec=matvec, dtype=float)
+        values, vectors = sparse_linalg.eigsh(operator, k=k, which='LA' if largest else 'SA',
+                                              v0=x0[:, 0], tol=tol)
+        order = np.argsort(-values if largest else values)
+        return values[order], vectors[:, order]
+
+    @staticmethod
+    def _get_dense_eigenpairs(mx, k: int, largest: bool, constraints: np.ndarray = None):
+        """
+        Dense counterpart of get_eigenpairs() for matrices too small for the iterative solvers.
+
+        :param mx: A symmetric numpy array or scipy sparse matrix.
+        :param k: The number of eigenpairs to calculate.
+        :param largest: Whether to calculate the largest or the smallest eigenpairs.
+        :param constraints: Orthonormal eigenvectors, with shape (n, c), to exclude.
+        :return: The eigenvalues, ordered from the most extreme, and the eigenvectors as columns.
+        """
+        if sparse.issparse(mx):
+            mx = mx.toarray()
+        mx = np.asarray(mx, dtype=float)
+        if constraints is not None:
+            # Project the constraints away and shift them to the opposite end of the spectrum
+            projection = np.eye(len(mx)) - constraints @ constraints.T
+            shift = (1 if largest else -1) * (np.abs(mx).sum(axis=1).max() + 1)
+            mx = projection @ mx @ projection - shift * (constraints @ constraints.T)
+        values, vectors = linalg.eigh(mx)
+        if largest:
+            values, vectors = values[::-1], vectors[:, ::-1]
+        return values[:k], vectors[:, :k]
+
     @staticmethod
     def second_largest(numbers: List[float], sorted_list: bool = False) -> float:
         """
@@ -133,7 +395,7 @@ class Analytics:
         return m2 if count >= 2 else None
 
     @staticmethod
-    @jit(nopython=True)
+    @_jit(nopython=True)
     def second_largest_cuda(numbers: List[float]) -> float:
         """
         Simple function to return the 2nd largest number in a list of numbers.
@@ -180,19 +442,42 @@ class Analytics:
         return m2 if count >= 2 else None
 
     @staticmethod
-    def convergence_rate(nxg: nx.Graph = None, stochastic_neighbour_matrix: List[List[float]] = None) -> float:
+    def convergence_rate(nxg: nx.Graph = None, stochastic_neighbour_matrix: List[List[float]] = None,
+                         lanczos: bool = False, tol: float = 0,
+                         symmetric_stochastic_matrix: Union[np.ndarray, sparse.spmatrix] = None) -> float:
         """
         Function to retrieve the 2nd largest eigenvalue in the adjacency matrix of a graph
 
+        By default all eigenvalues of the stochastic neighbour matrix are calculated. With lanczos, only the
+        two largest eigenvalues of the similar symmetric stochastic matrix are calculated with the iterative
+        Lanczos method (ARPACK), which is much faster for large graphs.
+
         :param nxg: networkx bi-directional graph object
         :type nxg: nx.Graph
         :param stochastic_neighbour_matrix: The stochastic neighbour matrix of the given graph.
         :type stochastic_neighbour_matrix: List[List[float]]
+        :param lanczos: Whether to use the iterative solver on the symmetric stochastic matrix.
+        :type lanczos: bool
+        :param tol: Relative accuracy of the result when using lanczos, where 0 means machine precision.
+        :type tol: float
+        :param symmetric_stochastic_matrix: The symmetric stochastic matrix of the given graph, which
+                                            implies lanczos.
+        :type symmetric_stochastic_matrix: Union[np.ndarray, sparse.spmatrix]
         :return: The 2nd largest eigenvalue of the adjacency matrix
         :rtype: float
         """
-        if nxg is None and stochastic_neighbour_matrix is None:
-            raise ValueError('At least one parameter of nxg or stochastic_neighbour_matrix needs to be provided')
+        if nxg is None and stochastic_neighbour_matrix is None and symmetric_stochastic_matrix is None:
+            raise ValueError('At least one parameter of nxg, stochastic_neighbour_matrix or '
+                             'symmetric_stochastic_matrix needs to be provided')
+
+        if lanczos or symmetric_stochastic_matrix is not None:
+            if symmetric_stochastic_matrix is not None:
+                S = symmetric_stochastic_matrix
+            elif stochastic_neighbour_matrix is not None:
+                S = Analytics._symmetrize_stochastic_matrix(stochastic_neighbour_matrix)
+            else:
+                S = Analytics.get_symmetric_stochastic_matrix(nxg)
+            return Analytics._get_largest_eigenvalues(S, 2, True, tol)[0]
 
         # If we wasn't provided with the adjacency matrix, get it.
         if stochastic_neighbour_matrix is None:
@@ -201,11 +486,165 @@ class Analytics:
         else:
             A = stochastic_neighbour_matrix
 
-        ev = Analytics.get_eigenvalues(A)
+        # Only the two largest eigenvalues are needed, which is faster for sparse matrices
+        ev = Analytics.get_eigenvalues(A, k=2 if sparse.issparse(A) else None)
         return Analytics.second_largest_cuda(ev)
 
     @staticmethod
-    @jit(nopython=True)
+    def get_convergence_eigenpair(adjacency_matrix, x0: np.ndarray = None,
+                                  tol: float = 0) -> Tuple[float, np.ndarray]:
+        """
+        Calculates the convergence rate together with its eigenvector using an iterative solver,
+        see get_eigenpairs(). The eigenvector can be used as x0 for a slightly changed graph.
+
+        :param adjacency_matrix: Self assigned adjacency matrix.
+        :type adjacency_matrix: Union[np.ndarray, sparse.spmatrix]
+        :param x0: Starting guess of the eigenvector, with shape (n, 1).
+        :param tol: Relative accuracy of the result, where 0 means machine precision.
+        :return: The convergence rate and its eigenvector.
+        :rtype: Tuple[float, np.ndarray]
+        """
+        symmetric_stochastic_matrix = Analytics.get_symmetric_stochastic_matrix(
+            adjacency_matrix=adjacency_matrix
+        )
+        # The largest eigenvalue is always 1, with an eigenvector proportional to the square root of the
+        # degrees. Exclude it so the solver finds the second largest one.
+        stationary_vector = 1 / np.sqrt(symmetric_stochastic_matrix.diagonal())
+        eigenvalues, eigenvectors = Analytics.get_eigenpairs(
+            symmetric_stochastic_matrix,
+            x0=x0,
+            constraints=stationary_vector,
+            tol=tol
+        )
+        return eigenvalues[0], eigenvectors
+
+    @staticmethod
+    @Instrumentation.timed('analytics.get_changed_convergence_rates')
+    def get_changed_convergence_rates(adjacency_matrix, removed: np.ndarray = None, added: np.ndarray = None,
+                                      x0: np.ndarray = None, tol: float = 0, batch_size: int = None,
+                                      return_eigenvectors: bool = False) \
+            -> Union[np.ndarray, Tuple[np.ndarray, Union[np.ndarray, None]]]:
+        """
+        Calculates the convergence rate of a graph after each of a number of independent changes, where
+        each change removes and/or adds one edge. The adjacency matrix itself isn't modified.
+
+        Graphs of up to dense_batch_limit nodes stack the matrices of many changes and calculate all their
+        eigenvalues in one batched call. Larger graphs evaluate each change with an iterative solver,
+        warm-started from x0 or the eigenvector of the unchanged graph.
+
+        :param adjacency_matrix: Self assigned adjacency matrix of the unchanged graph.
+        :type adjacency_matrix: Union[np.ndarray, sparse.spmatrix]
+        :param removed: Array of shape (b, 2) with the edge each change removes, or -1 for no edge.
+        :param added: Array of shape (b, 2) with the edge each change adds, or -1 for no edge.
+        :param x0: The convergence rate eigenvector of the unchanged graph, see get_convergence_eigenpair().
+        :param tol: Relative accuracy of the iterative solver, where 0 means machine precision.
+        :param batch_size: The number of matrices to stack in each batched call. Defaults to as many as fit
+                           in about 64 MB.
+        :param return_eigenvectors: Whether to also return the convergence rate eigenvector after each change,
+                                    which can be used as x0 once the change is made.
+        :return: The convergence rate after each change, and if return_eigenvectors is True, an array of shape
+                 (b, n) with the eigenvector after each change, or None for graphs of up to dense_batch_limit
+                 nodes.
+        """
+        if removed is None and added is None:
+            raise ValueError('At least one parameter of removed or added needs to be provided')
+        if removed is None:
+            removed = np.full_like(added, -1)
+        if added is None:
+            added = np.full_like(removed, -1)
+        removed = np.asarray(removed, dtype=np.intp).reshape(-1, 2)
+        added = np.asarray(added, dtype=np.intp).reshape(-1, 2)
+
+        if adjacency_matrix.shape[0] <= Analytics.dense_batch_limit:
+            convergence_rates = Analytics._get_changed_convergence_rates_dense(
+                adjacency_matrix, removed, added, batch_size
+            )
+            return (convergence_rates, None) if return_eigenvectors else convergence_rates
+        convergence_rates, eigenvectors = Analytics._get_changed_convergence_rates_iterative(
+            adjacency_matrix, removed, added, x0, tol
+        )
+        return (convergence_rates, eigenvectors) if return_eigenvectors else convergence_rates
+
+    @staticmethod
+    def _get_changed_convergence_rates_dense(adjacency_matrix, removed: np.ndarray, added: np.ndarray,
+                                             batch_size: int = None) -> np.ndarray:
+        """
+        Dense and batched implementation of get_changed_convergence_rates().
+        """
+        if sparse.issparse(adjacency_matrix):
+            adjacency_matrix = adjacency_matrix.toarray()
+        adjacency_matrix = np.asarray(adjacency_matrix, dtype=float)
+        if batch_size is None:
+            batch_size = max(1, 2 ** 23 // adjacency_matrix.size)
+
+        convergence_rates = np.empty(len(removed))
+        for start in range(0, len(removed), batch_size):
+            r = removed[start:start + batch_size]
+            a = added[start:start + batch_size]
+            stack = np.repeat(adjacency_matrix[np.newaxis], len(r), axis=0)
+
+            b = np.flatnonzero(r[:, 0] >= 0)
+            stack[b, r[b, 0], r[b, 1]] = stack[b, r[b, 1], r[b, 0]] = 0
+            b = np.flatnonzero(a[:, 0] >= 0)
+            stack[b, a[b, 0], a[b, 1]] = stack[b, a[b, 1], a[b, 0]] = 1
+
+            # Make each matrix symmetric stochastic, D^-1/2 * A * D^-1/2
+            scale = 1 / np.sqrt(stack.sum(axis=2))
+            stack *= scale[:, :, np.newaxis]
+            stack *= scale[:, np.newaxis, :]
+
+            convergence_rates[start:start + len(r)] = linalg.eigvalsh(stack)[:, -2]
+        return convergence_rates
+
+    @staticmethod
+    def _get_changed_convergence_rates_iterative(adjacency_matrix, removed: np.ndarray, added: np.ndarray,
+                                                 x0: np.ndarray = None,
+                                                 tol: float = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Iterative implementation of get_changed_convergence_rates(), which applies each change as a
+        sparse update of the adjacency matrix.
+        """
+        adjacency_matrix = sparse.csr_matrix(adjacency_matrix, dtype=float)
+        if x0 is None:
+            _, x0 = Analytics.get_convergence_eigenpair(adjacency_matrix, tol=tol)
+
+        convergence_rates = np.empty(len(removed))
+        eigenvectors = np.empty((len(removed), adjacency_matrix.shape[0]))
+        for index, (r, a) in enumerate(zip(removed.tolist(), added.tolist())):
+            rows, cols, values = [], [], []
+            if r[0] >= 0:
+                rows += [r[0], r[1]]
+                cols += [r[1], r[0]]
+                values += [-1.0, -1.0]
+            if a[0] >= 0:
+                rows += [a[0], a[1]]
+                cols += [a[1], a[0]]
+                values += [1.0, 1.0]
+            change = sparse.csr_matrix((values, (rows, cols)), shape=adjacency_matrix.shape)
+            convergence_rates[index], eigenvector = Analytics.get_convergence_eigenpair(
+                adjacency_matrix + change, x0, tol
+            )
+            eigenvectors[index] = eigenvector.reshape(-1)
+        return convergence_rates, eigenvectors
+
+    @staticmethod
+    def _symmetrize_stochastic_matrix(stochastic_neighbour_matrix) -> Union[np.ndarray, sparse.csr_matrix]:
+        """
+        Converts a stochastic neighbour matrix D^-1 * A into the symmetric D^-1/2 * A * D^-1/2.
+        The degrees are read from the diagonal, which holds 1/degree due to the self assignment.
+
+        :param stochastic_neighbour_matrix: The stochastic neighbour matrix of a graph.
+        :return: The symmetric stochastic matrix, in CSR format if the input is sparse.
+        """
+        if sparse.issparse(stochastic_neighbour_matrix):
+            mx = sparse.csr_matrix(stochastic_neighbour_matrix, dtype=float)
+        else:
+            mx = np.array(stochastic_neighbour_matrix, dtype=float)
+        sqrt_degrees = np.sqrt(1 / mx.diagonal())
+        return Analytics._scale_matrix(mx, sqrt_degrees, 1 / sqrt_degrees)
+
+    @staticmethod
+    @_jit(nopython=True)
     def convergence_rate_cuda(neighbour_matrix: np.ndarray) -> float:
         stochastic = neighbour_matrix / neighbour_matrix.sum(axis=1)
         eigenvalues = np.real(linalg.eigvals(stochastic))
@@ -261,19 +700,58 @@ class Analytics:
         return total
 
     @staticmethod
-    def hypothetical_max_edge_cost(nxg: nx.Graph) -> float:
+    def hypothetical_max_edge_cost(nxg: nx.Graph, weight_function: Callable[[int, int], float] = None,
+                                   sample_size: int = None, seed: int = None) -> float:
         """
         Calculates the hypothetical total edge cost if the graph were to be complete.
 
+        With the default weights, the squared distance between the nodes, the sum over all pairs of nodes
+        has the closed form n * sum(x^2) - sum(x)^2 for each coordinate, which is calculated without
+        creating any edges. The result is exact for integer coordinates. Float coordinates use the
+        equivalent n * sum((x - mean(x))^2), which stays accurate for coordinates far from 0.
+
+        Other weights are summed over all pairs of nodes one at a time, or estimated from a random sample of
+        pairs if sample_size is given.
+
         :rtype: float
         :param nxg: The graph to calculate the hypothetical edge cost of.
+        :param weight_function: Function that returns the weight of an edge between two nodes, given their
+                                node ids. Defaults to the squared distance between the nodes.
+        :param sample_size: The number of random pairs of nodes to estimate the cost from, when using a
+                            weight_function. Defaults to summing over all pairs.
+        :param seed: Seed for the random sample.
         :return: The total edge cost if the graph were complete.
         """
-        complete_graph = copy.deepcopy(nxg)
-        complete_graph = Solver.complete(complete_graph)
-        total_edge_cost = Analytics.total_edge_cost(complete_graph)
-        del complete_graph
-        return total_edge_cost
+        if weight_function is None:
+            coordinates = [(attributes['x'], attributes['y']) for _, attributes in nxg.nodes(data=True)]
+            node_count = len(coordinates)
+            if all(isinstance(value, numbers.Integral) for coordinate in coordinates for value in coordinate):
+                # Python integers don't overflow, so the closed form is exact
+                sum_x = sum(int(x) for x, _ in coordinates)
+                sum_y = sum(int(y) for _, y in coordinates)
+                sum_squares = sum(int(x) * int(x) + int(y) * int(y) for x, y in coordinates)
+                return node_count * sum_squares - sum_x * sum_x - sum_y * sum_y
+            if node_count == 0:
+                return 0
+            # The closed form cancels badly for floats far from 0, so it's calculated around the mean instead
+            total = 0.0
+            for values in zip(*coordinates):
+                mean = math.fsum(values) / node_count
+                total += node_count * math.fsum((value - mean) * (value - mean) for value in values)
+            return total
+
+        nodes = list(nxg.nodes())
+        pair_count = len(nodes) * (len(nodes) - 1) // 2
+        if sample_size is None or sample_size >= pair_count:
+            return sum(weight_function(origin, destination) for origin, destination in combinations(nodes, 2))
+
+        # Sample pairs of distinct nodes uniformly and scale the mean weight up to all pairs
+        rng = np.random.default_rng(seed)
+        origins = rng.integers(0, len(nodes), sample_size)
+        destinations = (origins + rng.integers(1, len(nodes), sample_size)) % len(nodes)
+        total = sum(weight_function(nodes[origin], nodes[destination])
+                    for origin, destination in zip(origins.tolist(), destinations.tolist()))
+        return total * pair_count / sample_size
 
     @staticmethod
     def get_distance_distribution(nxg: nx.Graph) -> Dict[int, int]:
@@ -318,8 +796,14 @@ class Analytics:
         :param nxg: A given graph with edges.
         :return: A dict with a distribution of the longest shortest paths between nodes.
         """
+        # Imported here since it imports numba, which is slow
+        try:
+            from Eccentricity import Eccentricity
+        except ImportError:
+            from .Eccentricity import Eccentricity
+
         # Get the eccentricity of the graph
-        eccentricities = nx.eccentricity(nxg)
+        eccentricities = Eccentricity.get_eccentricities(nxg)
         # Create a distribution dictionary
         distributions = {}
 
@@ -335,7 +819,7 @@ class Analytics:
         return distributions
 
     @staticmethod
-    @jit(nopython=True)
+    @_jit(nopython=True)
     def is_nodes_connected_cuda(mx: np.ndarray, origin: int, destination: int):
         size = len(mx)
         seen = set()
@@ -352,6 +836,7 @@ class Analytics:
         return False
 
     @staticmethod
+    @Instrumentation.timed('analytics.is_nodes_connected')
     def is_nodes_connected(nxg: nx.Graph, origin: int, destination: int) -> bool:
         """
         Checks if two nodes are connected with each other using a BFS approach.
@@ -438,6 +923,26 @@ class Analytics:
             count += c
         return occurrence / count
 
+    @staticmethod
+    def get_eccentricity_bounds(nxg: nx.Graph, searches: int = 20, seed: int = None) -> Dict[str, Any]:
+        """
+        Estimates the diameter and average eccentricity of a graph, with lower and upper bounds, from a limited
+        number of breadth first searches. This is much faster than get_eccentricity_distribution() for large
+        graphs, see Eccentricity.get_bounds().
+
+        :param nxg: The graph to get the bounds from.
+        :param searches: The largest number of breadth first searches. More searches give tighter bounds.
+        :param seed: Seed of the nodes that are searched from at random.
+        :return: The estimated 'diameter' and 'average_eccentricity', their 'diameter_bounds' and
+                 'average_eccentricity_bounds', the number of 'searches' that were done and whether they are 'exact'.
+        """
+        try:
+            from Eccentricity import Eccentricity
+        except ImportError:
+            from .Eccentricity import Eccentricity
+
+        return Eccentricity.get_bounds(nxg, searches, seed=seed)
+
     @staticmethod
     def get_degree_matrix(nxg: nx.Graph) -> List[List[int]]:
         # Sort the nodes in the graph
@@ -456,30 +961,33 @@ class Analytics:
         return mx
 
     @staticmethod
-    def get_laplacian_matrix(nxg: nx.Graph) -> List[List[int]]:
+    @Instrumentation.timed('analytics.get_laplacian_matrix')
+    def get_laplacian_matrix(nxg: nx.Graph, dtype=int, as_list: bool = False,
+                             as_sparse: bool = False) -> Union[np.ndarray, List[List[int]], sparse.csr_matrix]:
         """
         Calculates the laplacian matrix based on a given graph.
 
         :param nxg: The graph to get the laplacian matrix from.
+        :param dtype: The data type of the matrix.
+        :param as_list: Whether to return the matrix as a list of rows instead of an array.
+        :param as_sparse: Whether to return the matrix as a scipy CSR matrix instead of an array.
         :return: The laplacian matrix, such as L = D - A where
                     D = Degree matrix and
                     A = Adjacency matrix
         """
-        laplacian_matrix = []
-        degree_matrix = Analytics.get_degree_matrix(nxg)
-        adjacency_matrix = Analytics.get_adjacency_matrix(nxg)
-
-        dimension = len(adjacency_matrix)
+        adjacency_matrix = Analytics.get_adjacency_matrix(nxg, dtype=dtype, as_sparse=as_sparse)
+        degrees = np.asarray(adjacency_matrix.sum(axis=1)).ravel()
 
-        for r in range(0, dimension):
-            row = [0] * dimension
-            for c in range(0, dimension):
-                row[c] = degree_matrix[r][c] - adjacency_matrix[r][c]
-            laplacian_matrix.append(row)
+        if as_sparse:
+            return (sparse.diags(degrees).astype(dtype) - adjacency_matrix).tocsr()
 
+        laplacian_matrix = np.diag(degrees).astype(dtype) - adjacency_matrix
+        if as_list:
+            return laplacian_matrix.tolist()
         return laplacian_matrix
 
     @staticmethod
+    @Instrumentation.timed('analytics.is_graph_connected')
     def is_graph_connected(laplacian_matrix: List[List[int]]):
         """
         Checks whether a given graph is connected based on its laplacian matrix.
@@ -1,72 +1,166 @@
-from typing import List, Tuple, Union
+from typing import Callable, Dict, Iterable, List, Set, Tuple, Union
 
 from networkx import nx
+import numpy as np
+from scipy import sparse as scipy_sparse
 
 try:
     from Creator import Creator
     from Analytics import Analytics
+    from DynamicConnectivity import DynamicConnectivity
+    from BridgeIndex import BridgeIndex
+    from CompactGraph import CompactGraph
+    from WeightCache import WeightCache
+    from Instrumentation import Instrumentation
 except ImportError:
     from .Creator import Creator
     from .Analytics import Analytics
+    from .DynamicConnectivity import DynamicConnectivity
+    from .BridgeIndex import BridgeIndex
+    from .CompactGraph import CompactGraph
+    from .WeightCache import WeightCache
+    from .Instrumentation import Instrumentation
+
+
+class _JournalEntry:
+    """
+    What is needed to undo one change of an AnalyticsGraph: the edges that were added or removed with their
+    weights, the previous values of the matrix cells and degrees that were written, the cached metrics from
+    before the change, and the move that the bridge index was updated with in place.
+    """
+    __slots__ = ('graph', 'adjacency_matrix_sa', 'laplacian_matrix', 'degrees', 'metrics', 'bridge_move')
+
+    graph: List[Tuple[int, int, bool, Union[int, float]]]
+    adjacency_matrix_sa: List[Tuple[int, int, int]]
+    laplacian_matrix: List[Tuple[int, int, int]]
+    degrees: List[Tuple[int, int]]
+    metrics: Union[Tuple, None]
+    bridge_move: Union[Tuple[int, int, int], None]
+
+    def __init__(self):
+        self.graph = []
+        self.adjacency_matrix_sa = []
+        self.laplacian_matrix = []
+        self.degrees = []
+        self.metrics = None
+        self.bridge_move = None
 
 
 class AnalyticsGraph:
     _graph: nx.Graph
-    _old_graph = [List[Tuple[int, int, bool]]]
 
-    _adjacency_matrix_sa: List[List[int]]
-    _old_adjacency_matrix_sa: List[Tuple[int, int, int]]
+    _compact_graph: CompactGraph
+    _unsynced_edges: Dict[Tuple[int, int], bool]
 
-    #_laplacian_matrix: List[List[int]]
-    #_old_laplacian_matrix: List[Tuple[int, int, int]]
+    _sparse: bool
+    _adjacency_matrix_sa: Union[np.ndarray, scipy_sparse.csr_matrix, None]
+    _dirty_rows: Set[int]
+
+    _degrees: np.ndarray
+    _laplacian_matrix: Union[np.ndarray, None]
+
+    _algebraic_connectivity: float
+    _algebraic_connectivity_dirty: bool
+    _fiedler_vector: Union[np.ndarray, None]
 
     _convergence_rate: float
-    _old_convergence_rate: float
     _convergence_rate_dirty: bool
-    _old_convergence_rate_dirty: bool
 
-    _is_connected: bool
-    _old_is_connected: bool
-    _is_connected_dirty: bool
-    _old_is_connected_dirty: bool
+    _connectivity: DynamicConnectivity
 
-    _connectivity_nodes: Tuple[int, int]
-    _old_connectivity_nodes: Union[Tuple[int, int], None]
+    _bridge_index: Union[BridgeIndex, None]
 
     _edge_cost: int
-    _old_edge_cost: int
+
+    _journal: List[_JournalEntry]
+    _checkpoints: List[int]
 
     _dimension: int
 
-    def __init__(self, nxg: nx.Graph):
-        self._graph = nxg
-        self._adjacency_matrix_sa = Analytics.get_adjacency_matrix(self._graph, True)
-        #self._laplacian_matrix = Analytics.get_laplacian_matrix(self._graph)
+    _lanczos: bool
+    _tol: float
+
+    _warm_start: bool
+    _eigenvectors: Union[np.ndarray, None]
 
-        self._dimension = len(self._adjacency_matrix_sa)
+    # The convergence rate and eigenvector after each move scored by evaluate_moves() against the current graph
+    _scored_moves: Dict[Tuple[int, int, int], Tuple[float, Union[np.ndarray, None]]]
+
+    _coordinates: Union[np.ndarray, None]
+
+    def __init__(self, nxg: nx.Graph, sparse: bool = False, lanczos: bool = False, tol: float = 0,
+                 warm_start: bool = False):
+        """
+        :param nxg: The graph to work on. Node ids are expected to be 0 to n-1. Changes are made to a compact copy
+                    of the edges, and only made to the graph when it's requested with graph().
+        :param sparse: Whether to keep the adjacency matrix as a CSR matrix, whose changed rows are read again
+                       from the compact copy of the edges when it's needed, instead of as a dense one.
+                       Recommended for large graphs with few edges per node.
+        :param lanczos: Whether to calculate the convergence rate with the iterative Lanczos method on the
+                        symmetric stochastic matrix, see Analytics.convergence_rate().
+        :param tol: Relative accuracy of the convergence rate when using lanczos or warm_start,
+                    where 0 means machine precision.
+        :param warm_start: Whether to keep the eigenvector of the convergence rate between calculations,
+                           and use it as the starting guess for an iterative solver after each change.
+                           Recommended when making many small changes to a large graph.
+        """
+        self._graph = nxg
+        self._lanczos = lanczos
+        self._tol = tol
+        self._warm_start = warm_start
+        self._eigenvectors = None
+        self._scored_moves = {}
+        self._coordinates = None
+        edges = Analytics.get_edge_array(self._graph)
+        weights = [weight for _, _, weight in self._graph.edges(data='weight', default=0)]
+        self._compact_graph = CompactGraph(self._graph.number_of_nodes(), edges, weights)
+        self._unsynced_edges = {}
+        self._sparse = sparse
+        self._dirty_rows = set()
+        if sparse:
+            self._adjacency_matrix_sa = None
+        else:
+            self._adjacency_matrix_sa = Analytics.get_adjacency_matrix(self._graph, True)
+
+        self._dimension = self._graph.number_of_nodes()
+
+        # The degrees are the diagonal of the laplacian matrix, where the self assignment doesn't count
+        self._degrees = np.asarray(self.get_adjacency_matrix_sa().sum(axis=1)).ravel() - 1
+        if sparse:
+            self._laplacian_matrix = None
+        else:
+            self._laplacian_matrix = -self._adjacency_matrix_sa
+            self._laplacian_matrix[np.diag_indices(self._dimension)] = self._degrees
 
         self._convergence_rate = None
-        self._old_convergence_rate = None
         self._convergence_rate_dirty = True
-        self._old_convergence_rate_dirty = True
 
-        self._is_connected = None
-        self._old_is_connected = None
-        self._is_connected_dirty = True
-        self._old_is_connected_dirty = True
+        self._algebraic_connectivity = None
+        self._algebraic_connectivity_dirty = True
+        self._fiedler_vector = None
+
+        self._connectivity = DynamicConnectivity(self._dimension, neighbours=self._compact_graph.get_neighbours)
 
-        self._connectivity_nodes = None
-        self._old_connectivity_nodes = None
+        self._bridge_index = None
 
         self._edge_cost = Analytics.total_edge_cost(self._graph)
-        self._old_edge_cost = self._edge_cost
+
+        self._journal = []
+        self._checkpoints = []
 
     def graph(self) -> nx.Graph:
         """
-        Returns the graph instance that the class has been working on.
+        Returns the graph instance that the class has been working on, after making the changes to it that
+        have been made since it was last requested.
 
         :return: The current networkx graph instance.
         """
+        for (origin, destination), added in self._unsynced_edges.items():
+            if added:
+                self._graph.add_edge(origin, destination, weight=self._compact_graph.get_weight(origin, destination))
+            else:
+                self._graph.remove_edge(origin, destination)
+        self._unsynced_edges.clear()
         return self._graph
 
     def get_convergence_rate(self) -> float:
@@ -75,10 +169,30 @@ class AnalyticsGraph:
 
         :return:
         """
-        if self._convergence_rate_dirty:
+        if Instrumentation.enabled:
+            Instrumentation.count(
+                'analytics_graph.convergence_rate.' + ('miss' if self._convergence_rate_dirty else 'hit')
+            )
+        if self._convergence_rate_dirty and self._warm_start:
+            self._convergence_rate, self._eigenvectors = Analytics.get_convergence_eigenpair(
+                self.get_adjacency_matrix_sa(), self._eigenvectors, self._tol
+            )
+            self._convergence_rate_dirty = False
+        elif self._convergence_rate_dirty and self._lanczos:
+            # Convert the adjacency matrix to a symmetric stochastic one
+            symmetric_stochastic_matrix = Analytics.get_symmetric_stochastic_matrix(
+                adjacency_matrix=self.get_adjacency_matrix_sa()
+            )
+            # Get the convergence rate
+            self._convergence_rate = Analytics.convergence_rate(
+                symmetric_stochastic_matrix=symmetric_stochastic_matrix,
+                tol=self._tol
+            )
+            self._convergence_rate_dirty = False
+        elif self._convergence_rate_dirty:
             # Convert the stochastic neighbour matrix to a stochastic one
             stochastic_neighbour_matrix = Analytics.get_stochastic_neighbour_matrix(
-                adjacency_matrix=self._adjacency_matrix_sa
+                adjacency_matrix=self.get_adjacency_matrix_sa()
             )
             # Get the convergence rate
             self._convergence_rate = Analytics.convergence_rate(
@@ -87,23 +201,88 @@ class AnalyticsGraph:
             self._convergence_rate_dirty = False
         return self._convergence_rate
 
+    def get_algebraic_connectivity(self) -> float:
+        """
+        Calculates the algebraic connectivity of the current graph, which is the second smallest eigenvalue of
+        the laplacian matrix. It is above zero if and only if the graph is connected, and a larger value
+        means that the graph is harder to split.
+
+        The eigenvector of the value (the Fiedler vector) is kept between calculations and used as the
+        starting guess for the iterative solver after each change.
+
+        :return: The algebraic connectivity.
+        """
+        if Instrumentation.enabled:
+            Instrumentation.count(
+                'analytics_graph.algebraic_connectivity.' + ('miss' if self._algebraic_connectivity_dirty else 'hit')
+            )
+        if self._algebraic_connectivity_dirty:
+            laplacian_matrix = self.get_laplacian_matrix()
+            if self._sparse:
+                laplacian_matrix = laplacian_matrix.astype(float)
+            # The smallest eigenvalue is always 0, with a constant eigenvector. Exclude it so the solver finds
+            # the second smallest one.
+            eigenvalues, self._fiedler_vector = Analytics.get_eigenpairs(
+                laplacian_matrix,
+                largest=False,
+                x0=self._fiedler_vector,
+                constraints=np.ones(self._dimension),
+                tol=self._tol
+            )
+            self._algebraic_connectivity = eigenvalues[0]
+            self._algebraic_connectivity_dirty = False
+        return self._algebraic_connectivity
+
     def is_connected(self) -> bool:
         """
-        Checks whether the graph is connected or not.
+        Checks whether the graph is connected or not. The connectivity is kept up to date on each change,
+        see DynamicConnectivity, so this is a constant time lookup.
 
         :return:
         """
-        if self._is_connected_dirty:
-            if self._connectivity_nodes is None:
-                self._is_connected = nx.is_connected(self._graph)
-            else:
-                self._is_connected = Analytics.is_nodes_connected_cuda(
-                    mx=nx.to_numpy_matrix(self.graph(), weight=None),
-                    origin=self._connectivity_nodes[0],
-                    destination=self._connectivity_nodes[1]
-                )
-            self._is_connected_dirty = False
-        return self._is_connected
+        if Instrumentation.enabled:
+            Instrumentation.count('analytics_graph.is_connected')
+        return self._connectivity.is_connected()
+
+    def is_bridge(self, origin, destination) -> bool:
+        """
+        Checks whether removing an edge would split the graph, see BridgeIndex.
+        The bridges are found again on the first query after the graph has changed.
+
+        :param origin:
+        :param destination:
+        :return: True if the edge is a bridge, otherwise False.
+        """
+        return self._get_bridge_index().is_bridge(origin, destination)
+
+    def get_bridges(self):
+        """
+        Returns all edges whose removal would split the graph.
+
+        :return: A set of bridges, as (smaller node, larger node).
+        """
+        return self._get_bridge_index().get_bridges()
+
+    def would_disconnect(self, origin, old_destination, new_destination=None) -> bool:
+        """
+        Checks whether removing an edge, or moving it with move_edge(), would split the graph.
+        Can be used to filter out candidate moves before evaluating them.
+
+        :param origin:
+        :param old_destination:
+        :param new_destination: The new destination of the edge if it's moved, otherwise None.
+        :return: True if the graph would be split, otherwise False.
+        """
+        return self._get_bridge_index().would_disconnect(origin, old_destination, new_destination)
+
+    def _get_bridge_index(self) -> BridgeIndex:
+        if self._bridge_index is None:
+            start = Instrumentation.start()
+            self._bridge_index = BridgeIndex(
+                [self._compact_graph.get_neighbours(node) for node in range(self._dimension)]
+            )
+            Instrumentation.stop('analytics_graph.bridge_index', start)
+        return self._bridge_index
 
     def get_edge_cost(self) -> float:
         """
@@ -117,19 +296,16 @@ class AnalyticsGraph:
         if self.has_edge(origin, destination):
             return False
         self.reset_stage_actions()
+        self._stage_metrics()
 
-        self._stage_graph(origin, destination, False)
-        self._stage_is_connected()
-        self._stage_convergence_rate()
-        self._stage_edge_cost()
-
-        Creator.add_weighted_edge(self._graph, origin, destination, ignore_validity=True)
-        self._edge_cost += self._graph[origin][destination]['weight']
+        weight = Creator.get_edge_weight(self._graph, origin, destination)
+        self._stage_graph(origin, destination, False, weight)
+        self._add_graph_edge(origin, destination, weight)
         self._set_adjacency_matrix_sa(origin, destination, 1)
-        #self._laplacian_added_edge(origin, destination)
+        self._laplacian_added_edge(origin, destination)
 
         self._convergence_rate_dirty = True
-        # Is connected won't be dirty in this case
+        self._algebraic_connectivity_dirty = True
 
         return True
 
@@ -137,58 +313,214 @@ class AnalyticsGraph:
         if not self.has_edge(origin, destination):
             return False
         self.reset_stage_actions()
+        self._stage_metrics()
 
-        self._stage_graph(origin, destination, True)
-        self._stage_is_connected()
-        self._stage_convergence_rate()
-        self._stage_edge_cost()
-
-        self._edge_cost -= self._graph[origin][destination]['weight']
-
-        self._graph.remove_edge(origin, destination)
+        self._stage_graph(origin, destination, True, self._remove_graph_edge(origin, destination))
         self._set_adjacency_matrix_sa(origin, destination, 0)
-        #self._laplacian_removed_edge(origin, destination)
+        self._laplacian_removed_edge(origin, destination)
 
         self._convergence_rate_dirty = True
-        self._is_connected_dirty = True
-        self._connectivity_nodes = (origin, destination)
+        self._algebraic_connectivity_dirty = True
 
         return True
 
     def move_edge(self, origin, old_destination, new_destination):
-        if old_destination == new_destination:
-            return False
-        if self.has_edge(origin, new_destination) or not self.has_edge(origin, old_destination):
+        """
+        Moves one end of an edge from old_destination to new_destination. If the move was scored by the latest
+        call to evaluate_moves(), its convergence rate and eigenvector are kept instead of calculated again.
+
+        :param origin: The end of the edge that stays.
+        :param old_destination: The end of the edge that is moved.
+        :param new_destination: The node to move the end to.
+        :return: True if the edge was moved, otherwise False if it isn't a valid move, see is_valid_move().
+        """
+        if not AnalyticsGraph.is_valid_move(self.has_edge, origin, old_destination, new_destination):
             return False
+        scored = self._scored_moves.get((origin, old_destination, new_destination))
+        bridge_index = self._bridge_index
         self.reset_stage_actions()
-
-        self._stage_graph(origin, old_destination, True)
-        self._stage_graph(origin, new_destination, False)
-        self._stage_is_connected()
-        self._stage_convergence_rate()
-        self._stage_edge_cost()
+        self._stage_metrics()
 
         # Remove the old edge from the graph
-        self._edge_cost -= self._graph[origin][old_destination]['weight']
-        self._graph.remove_edge(origin, old_destination)
+        self._stage_graph(origin, old_destination, True, self._remove_graph_edge(origin, old_destination))
         self._set_adjacency_matrix_sa(origin, old_destination, 0)
-        #self._laplacian_removed_edge(origin, old_destination)
+        self._laplacian_removed_edge(origin, old_destination)
 
         # Add the new edge to the graph
-        Creator.add_weighted_edge(self._graph, origin, new_destination, ignore_validity=True)
-        self._edge_cost += self._graph[origin][new_destination]['weight']
+        weight = Creator.get_edge_weight(self._graph, origin, new_destination)
+        self._stage_graph(origin, new_destination, False, weight)
+        self._add_graph_edge(origin, new_destination, weight)
         self._set_adjacency_matrix_sa(origin, new_destination, 1)
-        #self._laplacian_added_edge(origin, new_destination)
+        self._laplacian_added_edge(origin, new_destination)
 
-        self._convergence_rate_dirty = True
-        self._is_connected_dirty = True
-        self._connectivity_nodes = (origin, old_destination)
+        # Moving an edge that isn't in the search tree of the bridge index leaves the tree as it is, so the index
+        # is updated in place rather than created again on the next query
+        if bridge_index is not None and bridge_index.move_edge(origin, old_destination, new_destination):
+            self._bridge_index = bridge_index
+            self._journal[-1].bridge_move = (origin, old_destination, new_destination)
+
+        if scored is not None:
+            self._convergence_rate, eigenvector = scored
+            self._convergence_rate_dirty = False
+            if eigenvector is not None:
+                self._eigenvectors = eigenvector.reshape(-1, 1).copy()
+        else:
+            self._convergence_rate_dirty = True
+        self._algebraic_connectivity_dirty = True
 
         return True
 
+    def evaluate_moves(self, candidates: List[Tuple[int, int, int]], batch_size: int = None,
+                       connected_only: bool = False) -> List[Union[Tuple[float, int], None]]:
+        """
+        Calculates what the convergence rate and edge cost would be after each of the given moves,
+        without changing the graph. Each move is evaluated on its own, as in move_edge(). The results are kept
+        until the graph is changed, so that making one of the moves with move_edge() doesn't calculate its
+        convergence rate again.
+
+        See Analytics.get_changed_convergence_rates() for how the convergence rates are calculated.
+
+        :param candidates: List of moves as (origin, old_destination, new_destination).
+        :param batch_size: The number of moves to stack in each batched call. Defaults to as many as fit
+                           in about 64 MB.
+        :param connected_only: Whether to skip the moves that would split the graph, see would_disconnect().
+        :return: A list with the convergence rate and the change in edge cost for each move, in the order of the
+                 candidates. Moves that move_edge() wouldn't make, or that are skipped, are None.
+        """
+        results = [None] * len(candidates)
+        valid = [
+            index for index, (origin, old_destination, new_destination) in enumerate(candidates)
+            if AnalyticsGraph.is_valid_move(self.has_edge, origin, old_destination, new_destination)
+            and not (connected_only and self.would_disconnect(origin, old_destination, new_destination))
+        ]
+        if len(valid) == 0:
+            return results
+
+        moves = np.array([candidates[index] for index in valid]).reshape(-1, 3)
+        origins, old_destinations, new_destinations = moves[:, 0], moves[:, 1], moves[:, 2]
+
+        # Calculate the edge cost deltas, from the weight cache of the graph if it has one
+        weight_cache = WeightCache.get(self._graph)
+        if weight_cache is not None:
+            old_weights = weight_cache.get_weights(origins, old_destinations)
+            new_weights = weight_cache.get_weights(origins, new_destinations)
+        else:
+            coordinates = self._get_coordinates()
+            old_weights = ((coordinates[origins] - coordinates[old_destinations]) ** 2).sum(axis=1)
+            new_weights = ((coordinates[origins] - coordinates[new_destinations]) ** 2).sum(axis=1)
+        edge_cost_deltas = (new_weights - old_weights).tolist()
+
+        convergence_rates, eigenvectors = Analytics.get_changed_convergence_rates(
+            self.get_adjacency_matrix_sa(),
+            removed=moves[:, [0, 1]],
+            added=moves[:, [0, 2]],
+            x0=self._eigenvectors,
+            tol=self._tol,
+            batch_size=batch_size,
+            return_eigenvectors=True
+        )
+
+        self._scored_moves = {}
+        for position, (index, convergence_rate, edge_cost_delta) in enumerate(
+                zip(valid, convergence_rates.tolist(), edge_cost_deltas)):
+            results[index] = (convergence_rate, edge_cost_delta)
+            self._scored_moves[tuple(moves[position].tolist())] = (
+                convergence_rate, eigenvectors[position] if eigenvectors is not None else None
+            )
+        return results
+
+    @staticmethod
+    def is_valid_move(has_edge: Callable[[int, int], bool], origin: int, old_destination: Union[int, None],
+                      new_destination: Union[int, None]) -> bool:
+        """
+        Checks whether a move can be made, which is the rule shared by move_edge(), evaluate_moves() and
+        ParallelEvaluator. The old edge has to exist and the new one must not. Moving an edge to a self loop isn't
+        valid, since the self assignment already fills the diagonal of the adjacency matrix, so the move would
+        only remove the old edge.
+
+        :param has_edge: Function of two nodes that returns whether the graph has the edge between them.
+        :param origin: The end of the edge that stays.
+        :param old_destination: The end of the edge that is moved, or None to only add the new edge.
+        :param new_destination: The node to move the end to, or None to only remove the old edge.
+        :return: True if the move is valid, otherwise False.
+        """
+        if old_destination == new_destination or new_destination == origin:
+            return False
+        if old_destination is not None and not has_edge(origin, old_destination):
+            return False
+        return new_destination is None or not has_edge(origin, new_destination)
+
+    def _add_graph_edge(self, origin, destination, weight):
+        """
+        Adds an edge to the compact graph and the connectivity, and marks it to be added to the networkx graph.
+
+        :param origin:
+        :param destination:
+        :param weight:
+        """
+        self._compact_graph.add_edge(origin, destination, weight)
+        self._connectivity.add_edge(origin, destination)
+        self._edge_cost += weight
+        self._mark_unsynced(origin, destination, True)
+
+    def _remove_graph_edge(self, origin, destination):
+        """
+        Removes an edge from the compact graph and the connectivity, and marks it to be removed from the
+        networkx graph.
+
+        :param origin:
+        :param destination:
+        :return: The weight of the removed edge.
+        """
+        weight = self._compact_graph.remove_edge(origin, destination)
+        self._connectivity.remove_edge(origin, destination)
+        self._edge_cost -= weight
+        self._mark_unsynced(origin, destination, False)
+        return weight
+
+    def _mark_unsynced(self, origin, destination, added):
+        # An edge that is changed back is already as in the networkx graph
+        edge = (origin, destination) if origin <= destination else (destination, origin)
+        if edge in self._unsynced_edges:
+            del self._unsynced_edges[edge]
+        else:
+            self._unsynced_edges[edge] = added
+
+    def _get_coordinates(self) -> np.ndarray:
+        """
+        Returns the coordinates of all nodes as an array, which is created on the first call.
+
+        :return: An array of shape (n, 2) with the coordinates of each node.
+        """
+        if self._coordinates is None:
+            self._coordinates = Analytics.get_coordinate_array(self._graph)
+        return self._coordinates
+
+    def get_neighbours(self, node) -> List[int]:
+        """
+        :param node:
+        :return: The neighbours of the node in the current graph, read from the compact copy of the edges.
+        """
+        return self._compact_graph.get_neighbours(node)
+
+    def get_degrees(self) -> np.ndarray:
+        """
+        :return: The number of neighbours of each node in the current graph, not counting self loops. The array is
+                 kept up to date on each change, and must not be modified.
+        """
+        return self._degrees
+
+    def get_edges(self) -> np.ndarray:
+        """
+        :return: Array of shape (m, 2) with the edges of the current graph as (smaller node, larger node),
+                 without self loops.
+        """
+        edges, _ = self._compact_graph.get_edges()
+        return edges[edges[:, 0] != edges[:, 1]].astype(np.intp)
+
     def has_edge(self, origin, destination):
         """
-        Checks whether the graph has an edge by looking up directly in a adjacency matrix.
+        Checks whether the graph has an edge by looking it up in the compact copy of the edges.
 
         :param origin:
         :param destination:
@@ -196,136 +528,322 @@ class AnalyticsGraph:
         """
         if origin == destination:
             return False
-        return self._adjacency_matrix_sa[origin][destination] == 1
+        return self._compact_graph.has_edge(origin, destination)
 
     def _set_adjacency_matrix_sa(self, origin, destination, val):
         """
-        Sets a mirrored value for the _adjacency_matrix_sa matrix.
+        Sets a mirrored value for the _adjacency_matrix_sa matrix. In sparse mode the rows of both nodes are
+        instead marked as changed, and read again from the compact graph when the matrix is needed.
+        The diagonal is the self assignment, so self loops don't change the matrix.
 
         :param origin:
         :param destination:
         :param val:
         """
+        if origin == destination:
+            return
+        if self._sparse:
+            self._dirty_rows.add(origin)
+            self._dirty_rows.add(destination)
+            return
         self._stage_adjacency_matrix_sa(origin, destination)
 
-        self._adjacency_matrix_sa[origin][destination] = val
-        self._adjacency_matrix_sa[destination][origin] = val
+        self._adjacency_matrix_sa[origin, destination] = val
+        self._adjacency_matrix_sa[destination, origin] = val
+
+    def _stage_adjacency_matrix_sa(self, origin, destination):
+        """
+        Stages the values for the adjacency matrix with self-assignment.
+
+        :param origin:
+        :param destination:
+        """
+        self._journal[-1].adjacency_matrix_sa += [
+            (origin, destination, self._adjacency_matrix_sa[origin, destination]),
+            (destination, origin, self._adjacency_matrix_sa[destination, origin])
+        ]
 
     def _laplacian_added_edge(self, origin, destination):
         """
-        Updates the laplacian matrix based on adding an edge.
+        Updates the degrees and the laplacian matrix based on adding an edge. Self loops cancel out in the
+        laplacian matrix, so they don't change it.
 
         :param origin:
         :param destination:
         """
-        raise NotImplementedError
+        if origin == destination:
+            return
         self._stage_laplacian(origin, destination)
 
-        self._laplacian_matrix[origin][destination] = -1
-        self._laplacian_matrix[destination][origin] = -1
-
-        self._laplacian_matrix[origin][origin] += 1
-        self._laplacian_matrix[destination][destination] += 1
+        self._degrees[origin] += 1
+        self._degrees[destination] += 1
+        if self._laplacian_matrix is not None:
+            self._laplacian_matrix[origin, destination] = -1
+            self._laplacian_matrix[destination, origin] = -1
+            self._laplacian_matrix[origin, origin] = self._degrees[origin]
+            self._laplacian_matrix[destination, destination] = self._degrees[destination]
 
     def _laplacian_removed_edge(self, origin, destination):
         """
-        Updates the laplacian matrix based on removing an edge.
+        Updates the degrees and the laplacian matrix based on removing an edge.
 
         :param origin:
         :param destination:
         """
-        raise NotImplementedError
+        if origin == destination:
+            return
         self._stage_laplacian(origin, destination)
 
-        self._laplacian_matrix[origin][destination] = 0
-        self._laplacian_matrix[destination][origin] = 0
-
-        self._laplacian_matrix[origin][origin] -= 1
-        self._laplacian_matrix[destination][destination] -= 1
+        self._degrees[origin] -= 1
+        self._degrees[destination] -= 1
+        if self._laplacian_matrix is not None:
+            self._laplacian_matrix[origin, destination] = 0
+            self._laplacian_matrix[destination, origin] = 0
+            self._laplacian_matrix[origin, origin] = self._degrees[origin]
+            self._laplacian_matrix[destination, destination] = self._degrees[destination]
 
     def _stage_laplacian(self, origin, destination):
         """
-        Stages the values for the laplacian matrix.
+        Stages the degrees and the off-diagonal values of the laplacian matrix. The diagonal is restored from
+        the degrees.
 
         :param origin:
         :param destination:
         """
-        self._old_laplacian_matrix += [
-            (origin, destination, self._laplacian_matrix[origin][destination]),
-            (destination, origin, self._laplacian_matrix[destination][origin]),
-            (origin, origin, self._laplacian_matrix[origin][origin]),
-            (destination, destination, self._laplacian_matrix[destination][destination]),
+        self._journal[-1].degrees += [
+            (origin, self._degrees[origin]),
+            (destination, self._degrees[destination])
+        ]
+        if self._laplacian_matrix is not None:
+            self._journal[-1].laplacian_matrix += [
+                (origin, destination, self._laplacian_matrix[origin, destination]),
+                (destination, origin, self._laplacian_matrix[destination, origin])
+            ]
+
+    def _stage_graph(self, origin, destination, edge, weight):
+        self._journal[-1].graph += [
+            (origin, destination, edge, weight)
         ]
 
-    def _stage_adjacency_matrix_sa(self, origin, destination):
+    def _stage_metrics(self):
         """
-        Stages the values for the adjacency matrix with self-assignment.
-
-        :param origin:
-        :param destination:
+        Stages the cached metrics, which are restored as they are when the change is undone.
         """
-        self._old_adjacency_matrix_sa += [
-            (origin, destination, self._adjacency_matrix_sa[origin][destination]),
-            (destination, origin, self._adjacency_matrix_sa[destination][origin])
-        ]
+        self._journal[-1].metrics = (
+            self._convergence_rate, self._convergence_rate_dirty, self._eigenvectors,
+            self._algebraic_connectivity, self._algebraic_connectivity_dirty, self._fiedler_vector,
+            self._bridge_index, self._edge_cost
+        )
+        # The bridges change with the graph, so find them again when needed
+        self._bridge_index = None
+        self._scored_moves = {}
+
+    def checkpoint(self) -> int:
+        """
+        Marks the current state of the graph, so that it can be restored with rollback(). Checkpoints can be
+        nested, and each one is ended by either rollback() or commit().
 
-    def _stage_graph(self, origin, destination, edge):
-        self._old_graph += [
-            (origin, destination, edge)
-        ]
+        While a checkpoint is active, each change is kept in a journal of the matrix cells it wrote and the
+        cached metrics it replaced. Rolling back k changes therefore takes time proportional to k, rather
+        than to the size of the graph.
 
-    def _stage_convergence_rate(self):
-        self._old_convergence_rate = self._convergence_rate
-        self._old_convergence_rate_dirty = self._old_convergence_rate_dirty
+        **Example usage**::
 
-    def _stage_is_connected(self):
-        self._old_is_connected = self._is_connected
-        self._old_is_connected_dirty = self._is_connected_dirty
-        self._old_connectivity_nodes = self._connectivity_nodes
+            outer = ag.checkpoint()
+            ag.move_edge(1, 2, 5)
+            inner = ag.checkpoint()
+            ag.move_edge(3, 4, 6)
+            ag.rollback(inner)      # Undoes the second move
+            ag.rollback(outer)      # Undoes the first move
 
-    def _stage_edge_cost(self):
-        self._old_edge_cost = self._edge_cost
+        :return: The checkpoint, which is its nesting depth starting at 0.
+        """
+        self._checkpoints.append(len(self._journal))
+        return len(self._checkpoints) - 1
 
-    def revert(self):
-        # Revert the graph
-        for action in self._old_graph:
-            if action[2] is True:
-                Creator.add_weighted_edge(self._graph, action[0], action[1], True)
+    def rollback(self, to: int = None):
+        """
+        Undoes all changes made since a checkpoint, and ends that checkpoint and all checkpoints nested in it.
+
+        :param to: The checkpoint to roll back to. Defaults to the latest one.
+        """
+        to = self._get_checkpoint(to)
+        if Instrumentation.enabled:
+            Instrumentation.count('analytics_graph.rollback')
+        position = self._checkpoints[to]
+        nodes = set()
+        while len(self._journal) > position:
+            entry = self._journal.pop()
+            nodes.update(node for node, _ in entry.degrees)
+            self._undo(entry)
+        del self._checkpoints[to:]
+        self._check_laplacian(nodes)
+
+    def _check_laplacian(self, nodes: Iterable[int]):
+        """
+        Checks that the degrees of the laplacian matrix still match the graph, which is its diagonal being the
+        sum of the rest of its row. Takes time proportional to the rows of the given nodes.
+
+        :param nodes: The nodes whose rows to check.
+        :raises RuntimeError: If the degree of a node doesn't match the graph.
+        """
+        for node in nodes:
+            if self._laplacian_matrix is not None:
+                row_sum = self._laplacian_matrix[node].sum() - self._laplacian_matrix[node, node]
             else:
-                self._graph.remove_edge(action[0], action[1])
+                row_sum = -sum(1 for neighbour in self._compact_graph.get_neighbours(node) if neighbour != node)
+            if self._degrees[node] != -row_sum:
+                raise RuntimeError('The laplacian matrix has degree {} for node {}, which has {} neighbours'.format(
+                    self._degrees[node], node, -row_sum
+                ))
 
-        # Revert the laplacian matrix
-        #for action in self._old_laplacian_matrix:
-        #    self._laplacian_matrix[action[0]][action[1]] = action[2]
+    def commit(self, to: int = None):
+        """
+        Keeps all changes made since a checkpoint, and ends that checkpoint and all checkpoints nested in it.
+        The changes can still be undone by rolling back an enclosing checkpoint.
 
-        # Revert the adjacency matrix
-        for action in self._old_adjacency_matrix_sa:
-            self._adjacency_matrix_sa[action[0]][action[1]] = action[2]
+        :param to: The checkpoint to commit. Defaults to the latest one.
+        """
+        to = self._get_checkpoint(to)
+        del self._checkpoints[to:]
+        if len(self._checkpoints) == 0:
+            # Nothing can roll back past this point anymore, except revert() of the latest change
+            del self._journal[:-1]
+
+    def _get_checkpoint(self, checkpoint: Union[int, None]) -> int:
+        if checkpoint is None:
+            checkpoint = len(self._checkpoints) - 1
+        if not 0 <= checkpoint < len(self._checkpoints):
+            raise ValueError('No active checkpoint {}'.format(checkpoint))
+        return checkpoint
+
+    def revert(self) -> bool:
+        """
+        Undoes the latest change. Can be repeated to undo earlier changes made since the oldest active
+        checkpoint, otherwise only the latest change can be undone.
 
-        # Revert the convergence rate
-        self._convergence_rate = self._old_convergence_rate
-        self._convergence_rate_dirty = self._old_convergence_rate_dirty
+        :return: True if a change was undone, otherwise False.
+        """
+        if len(self._journal) == 0:
+            return False
+        if Instrumentation.enabled:
+            Instrumentation.count('analytics_graph.revert')
+        self._undo(self._journal.pop())
+        # Checkpoints after the undone change now mark the state before it
+        self._checkpoints = [min(position, len(self._journal)) for position in self._checkpoints]
+        return True
 
-        # Revert the is connected state
-        self._is_connected = self._old_is_connected
-        self._is_connected_dirty = self._old_is_connected_dirty
-        self._connectivity_nodes = self._old_connectivity_nodes
+    def _undo(self, entry: _JournalEntry):
+        """
+        Restores the state from before the change of a journal entry. Entries have to be undone from the
+        latest to the oldest.
 
-        # Revert the edge cost
-        self._edge_cost = self._old_edge_cost
+        :param entry:
+        """
+        # Revert the graph
+        for origin, destination, edge, weight in reversed(entry.graph):
+            if edge is True:
+                self._add_graph_edge(origin, destination, weight)
+            else:
+                self._remove_graph_edge(origin, destination)
+
+        # Revert the adjacency matrix, where the sparse one reads the reverted rows from the compact graph again
+        if self._sparse:
+            for origin, destination, _, _ in entry.graph:
+                self._set_adjacency_matrix_sa(origin, destination, None)
+        for row, col, value in reversed(entry.adjacency_matrix_sa):
+            self._adjacency_matrix_sa[row, col] = value
+
+        # Revert the laplacian matrix, in reverse since a move stages the degrees of the origin twice
+        for row, col, value in reversed(entry.laplacian_matrix):
+            self._laplacian_matrix[row, col] = value
+        for node, degree in reversed(entry.degrees):
+            self._degrees[node] = degree
+            if self._laplacian_matrix is not None:
+                self._laplacian_matrix[node, node] = degree
+
+        # Revert the cached metrics, where the bridges are valid again for the reverted graph once a move made
+        # to them in place is reversed
+        (self._convergence_rate, self._convergence_rate_dirty, self._eigenvectors,
+         self._algebraic_connectivity, self._algebraic_connectivity_dirty, self._fiedler_vector,
+         self._bridge_index, self._edge_cost) = entry.metrics
+        if entry.bridge_move is not None:
+            origin, old_destination, new_destination = entry.bridge_move
+            self._bridge_index.move_edge(origin, new_destination, old_destination)
+        self._scored_moves = {}
 
     def reset_stage_actions(self):
-        #self._old_laplacian_matrix = []
-        self._old_adjacency_matrix_sa = []
-        self._old_graph = []
-        self._old_connectivity_nodes = None
+        """
+        Starts a new journal entry for the next change. Without an active checkpoint, only the entry of the
+        latest change is kept.
+        """
+        if len(self._checkpoints) == 0:
+            self._journal.clear()
+        self._journal.append(_JournalEntry())
 
-    def get_adjacency_matrix_sa(self):
+    def get_adjacency_matrix_sa(self) -> Union[np.ndarray, scipy_sparse.csr_matrix]:
+        """
+        :return: The adjacency matrix with self assignment, as a dense array that is kept up to date, or in sparse
+                 mode as a CSR matrix where the rows that changed since the last call are updated. The matrix must
+                 not be modified.
+        """
+        if self._adjacency_matrix_sa is None:
+            adjacency_matrix = self._compact_graph.tocsr()
+            # Self loops are replaced by the self assignment
+            adjacency_matrix = adjacency_matrix - scipy_sparse.diags(adjacency_matrix.diagonal(), dtype=int) + \
+                scipy_sparse.identity(self._dimension, dtype=int)
+            adjacency_matrix.eliminate_zeros()
+            self._adjacency_matrix_sa = adjacency_matrix.tocsr()
+            self._dirty_rows.clear()
+        elif len(self._dirty_rows) > 0:
+            self._adjacency_matrix_sa = self._update_sparse_rows(self._adjacency_matrix_sa, sorted(self._dirty_rows))
+            self._dirty_rows.clear()
         return self._adjacency_matrix_sa
 
-    def get_laplacian_matrix(self):
-        raise NotImplementedError
-        return self._laplacian_matrix
+    def _update_sparse_rows(self, adjacency_matrix: scipy_sparse.csr_matrix,
+                            rows: List[int]) -> scipy_sparse.csr_matrix:
+        """
+        Creates a copy of a self assigned CSR adjacency matrix where some rows are read again from the compact graph.
+        The other rows are copied as slices between the changed ones, so it takes time proportional to the number
+        of changed rows and a copy of the arrays, rather than creating the matrix again.
+
+        :param adjacency_matrix: The matrix to update.
+        :param rows: The changed rows, in increasing order.
+        :return: The updated matrix.
+        """
+        indptr, indices = adjacency_matrix.indptr, adjacency_matrix.indices
+        row_lengths = np.diff(indptr)
+        pieces = []
+        previous = 0
+        for row in rows:
+            # Self loops are replaced by the self assignment
+            neighbours = [neighbour for neighbour in self._compact_graph.get_neighbours(row) if neighbour != row]
+            neighbours.append(row)
+            neighbours.sort()
+            pieces.append(indices[indptr[previous]:indptr[row]])
+            pieces.append(np.array(neighbours, dtype=indices.dtype))
+            row_lengths[row] = len(neighbours)
+            previous = row + 1
+        pieces.append(indices[indptr[previous]:])
+
+        indptr = np.zeros_like(indptr)
+        np.cumsum(row_lengths, out=indptr[1:])
+        indices = np.concatenate(pieces)
+        return scipy_sparse.csr_matrix(
+            (np.ones(len(indices), dtype=adjacency_matrix.dtype), indices, indptr), shape=adjacency_matrix.shape
+        )
+
+    def get_laplacian_matrix(self) -> Union[np.ndarray, scipy_sparse.csr_matrix]:
+        """
+        Returns the laplacian matrix of the current graph, which is kept up to date on each change.
+
+        :return: The laplacian matrix as a dense array, which must not be modified, or in sparse mode as a CSR
+                 matrix of the degrees and the rows of the adjacency matrix.
+        """
+        if self._laplacian_matrix is not None:
+            return self._laplacian_matrix
+        # The self assignment of the adjacency matrix cancels out against the identity
+        return (scipy_sparse.diags(self._degrees + 1) - self.get_adjacency_matrix_sa()).tocsr()
 
     def get_dimension(self):
         return self._dimension
\ No newline at end of file
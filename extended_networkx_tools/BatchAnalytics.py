@@ -0,0 +1,297 @@
+import argparse
+import concurrent.futures
+import csv
+import json
+import multiprocessing
+import os
+import pickle
+import sys
+import time
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, List, Set, Union
+
+import networkx as nx
+
+try:
+    from Analytics import Analytics
+    from Creator import Creator
+    from GraphFile import GraphFile
+except ImportError:
+    from .Analytics import Analytics
+    from .Creator import Creator
+    from .GraphFile import GraphFile
+
+
+class BatchAnalytics:
+    """
+    Scores corpora of saved graphs, such as the convergence rate, edge cost and average eccentricity of each
+    graph, in a pool of worker processes.
+
+    Graphs are read from GraphFile files (.enxg), JSON files with the 'nodes' and 'edges' of
+    Analytics.get_node_dict() and get_edge_dict() (.json), or pickles of either a networkx graph or such a
+    dict (.pickle, .pkl). The paths are streamed through the pool with a bounded number of graphs in flight,
+    and each result is written as soon as it's done, as JSON Lines or CSV. A run that was stopped can be
+    resumed, which skips the graphs already in the output.
+
+    The same is available from the command line::
+
+        extended-networkx-analytics corpus/ --output results.jsonl --workers 8 --resume
+
+    **Example usage**::
+
+        summary = BatchAnalytics.run(['corpus/'], 'results.csv', metrics=['convergence_rate', 'edge_cost'])
+        for result in BatchAnalytics.score_paths(BatchAnalytics.find_graphs(['corpus/'])):
+            print(result['path'], result['convergence_rate'])
+    """
+    # Functions of each metric that can be calculated
+    metrics: Dict[str, Callable[[nx.Graph], Any]] = {
+        'nodes': lambda nxg: nxg.number_of_nodes(),
+        'edges': lambda nxg: nxg.number_of_edges(),
+        'connected': lambda nxg: nx.is_connected(nxg),
+        'convergence_rate': lambda nxg: Analytics.convergence_rate(nxg),
+        'convergence_rate_lanczos': lambda nxg: Analytics.convergence_rate(nxg, lanczos=True),
+        'edge_cost': lambda nxg: Analytics.total_edge_cost(nxg),
+        'average_eccentricity': lambda nxg: Analytics.get_average_eccentricity(nxg),
+        'approximate_average_eccentricity':
+            lambda nxg: Analytics.get_eccentricity_bounds(nxg, seed=0)['average_eccentricity'],
+    }
+    default_metrics = ['nodes', 'edges', 'convergence_rate', 'edge_cost', 'average_eccentricity']
+    extensions = ('.enxg', '.json', '.pickle', '.pkl')
+
+    @staticmethod
+    def find_graphs(paths: Iterable[str]) -> Iterator[str]:
+        """
+        Finds the graph files among files and directories, where directories are searched recursively in sorted
+        order. Files in directories are only included if they have one of the supported extensions.
+
+        :param paths: Files and directories.
+        :return: The graph files, one at a time.
+        """
+        for path in paths:
+            if not os.path.isdir(path):
+                yield path
+                continue
+            for directory, directories, files in os.walk(path):
+                directories.sort()
+                for file in sorted(files):
+                    if file.endswith(BatchAnalytics.extensions):
+                        yield os.path.join(directory, file)
+
+    @staticmethod
+    def load_graph(path: str) -> nx.Graph:
+        """
+        Loads a graph from a file, see the supported formats above.
+
+        :param path: The file to read.
+        :return: The graph.
+        """
+        if path.endswith('.enxg'):
+            return GraphFile.load(path)
+        if path.endswith('.json'):
+            with open(path) as file:
+                spec = json.load(file)
+        else:
+            with open(path, 'rb') as file:
+                spec = pickle.load(file)
+            if isinstance(spec, nx.Graph):
+                return spec
+        # JSON turns the node ids into strings
+        return Creator.from_spec(
+            {int(node): tuple(position) for node, position in spec['nodes'].items()},
+            {int(node): list(neighbours) for node, neighbours in spec['edges'].items()}
+        )
+
+    @staticmethod
+    def score(path: str, metrics: List[str] = None) -> Dict[str, Any]:
+        """
+        Loads a graph and calculates its metrics. Errors are recorded in the result instead of raised, so one
+        broken graph doesn't stop a batch.
+
+        :param path: The file of the graph.
+        :param metrics: The names of the metrics to calculate, see BatchAnalytics.metrics.
+        :return: The path, the value of each metric, which is None if it failed, and the errors or None.
+        """
+        metrics = BatchAnalytics.default_metrics if metrics is None else metrics
+        result = {'path': path}
+        errors = []
+        try:
+            nxg = BatchAnalytics.load_graph(path)
+        except Exception as error:
+            nxg = None
+            errors.append('load: {}'.format(error))
+        for metric in metrics:
+            result[metric] = None
+            if nxg is None:
+                continue
+            try:
+                value = BatchAnalytics.metrics[metric](nxg)
+                # Numpy scalars can't be written as JSON
+                result[metric] = value.item() if hasattr(value, 'item') else value
+            except Exception as error:
+                errors.append('{}: {}'.format(metric, error))
+        result['error'] = '; '.join(errors) if errors else None
+        return result
+
+    @staticmethod
+    def score_paths(paths: Iterable[str], metrics: List[str] = None, workers: int = None,
+                    max_pending: int = None) -> Iterator[Dict[str, Any]]:
+        """
+        Scores graphs in a pool of worker processes. The paths are read lazily, and at most max_pending graphs
+        are scored or waiting at a time, so memory use doesn't grow with the number of graphs.
+
+        :param paths: The files of the graphs, such as from find_graphs().
+        :param metrics: The names of the metrics to calculate, see BatchAnalytics.metrics.
+        :param workers: The number of worker processes. Defaults to the number of CPUs. With 1 worker, the graphs
+                        are scored in this process.
+        :param max_pending: The largest number of graphs in flight. Defaults to 4 per worker.
+        :return: The result of each graph, see score(), in the order they finish.
+        """
+        metrics = BatchAnalytics._get_metrics(metrics)
+        workers = multiprocessing.cpu_count() if workers is None else workers
+        if workers <= 1:
+            for path in paths:
+                yield BatchAnalytics.score(path, metrics)
+            return
+
+        max_pending = 4 * workers if max_pending is None else max_pending
+        paths = iter(paths)
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            pending = set()
+            while True:
+                for path in paths:
+                    pending.add(executor.submit(BatchAnalytics.score, path, metrics))
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    return
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+    @staticmethod
+    def run(paths: Iterable[str], output: str, metrics: List[str] = None, workers: int = None,
+            resume: bool = False, output_format: str = None) -> Dict[str, Any]:
+        """
+        Scores the graphs in files and directories, and writes each result to a file as soon as it's done.
+
+        :param paths: Files and directories, see find_graphs().
+        :param output: The file to write the results to, or '-' for stdout.
+        :param metrics: The names of the metrics to calculate, see BatchAnalytics.metrics.
+        :param workers: The number of worker processes. Defaults to the number of CPUs.
+        :param resume: Whether to keep the results already in the output, and skip their graphs. Otherwise the
+                       output is overwritten.
+        :param output_format: Either 'jsonl' or 'csv'. Defaults to csv for files ending with .csv, otherwise jsonl.
+        :return: The number of graphs scored, skipped because they were already done, and that had errors, and the
+                 elapsed time in seconds.
+        """
+        metrics = BatchAnalytics._get_metrics(metrics)
+        if output_format is None:
+            output_format = 'csv' if output.endswith('.csv') else 'jsonl'
+        if output_format not in ('jsonl', 'csv'):
+            raise ValueError('The output format needs to be jsonl or csv')
+
+        done = BatchAnalytics._read_done(output, output_format) if resume and output != '-' else set()
+        skipped = 0
+
+        def remaining() -> Iterator[str]:
+            nonlocal skipped
+            for path in BatchAnalytics.find_graphs(paths):
+                if path in done:
+                    skipped += 1
+                else:
+                    yield path
+
+        start = time.perf_counter()
+        scored = errors = 0
+        file = sys.stdout if output == '-' else BatchAnalytics._open_output(output, resume and len(done) > 0)
+        try:
+            fields = ['path'] + list(metrics) + ['error']
+            writer = csv.DictWriter(file, fields) if output_format == 'csv' else None
+            if writer is not None and (output == '-' or file.tell() == 0):
+                writer.writeheader()
+            for result in BatchAnalytics.score_paths(remaining(), metrics, workers):
+                if writer is not None:
+                    writer.writerow(result)
+                else:
+                    file.write(json.dumps(result) + '\n')
+                file.flush()
+                scored += 1
+                errors += result['error'] is not None
+        finally:
+            if file is not sys.stdout:
+                file.close()
+        return {'scored': scored, 'skipped': skipped, 'errors': errors, 'elapsed': time.perf_counter() - start}
+
+    @staticmethod
+    def _get_metrics(metrics: Union[List[str], None]) -> List[str]:
+        metrics = BatchAnalytics.default_metrics if metrics is None else list(metrics)
+        unknown = [metric for metric in metrics if metric not in BatchAnalytics.metrics]
+        if unknown:
+            raise ValueError('Unknown metrics {}, available metrics are {}'.format(
+                ', '.join(unknown), ', '.join(BatchAnalytics.metrics)
+            ))
+        return metrics
+
+    @staticmethod
+    def _read_done(output: str, output_format: str) -> Set[str]:
+        """
+        Reads the paths of the graphs that are already in an output file. A last line that was cut off by a
+        stopped run is ignored.
+        """
+        if not os.path.exists(output):
+            return set()
+        done = set()
+        with open(output, newline='') as file:
+            if output_format == 'csv':
+                for row in csv.DictReader(file):
+                    # The error is the last column, which is missing from a row that was cut off
+                    if row.get('error') is not None:
+                        done.add(row['path'])
+            else:
+                for line in file:
+                    try:
+                        done.add(json.loads(line)['path'])
+                    except (ValueError, KeyError):
+                        pass
+        return done
+
+    @staticmethod
+    def _open_output(output: str, append: bool) -> IO:
+        if not append:
+            return open(output, 'w', newline='')
+        # Start on a new line if the last line was cut off
+        with open(output, 'rb') as file:
+            if file.seek(0, os.SEEK_END) > 0:
+                file.seek(-1, os.SEEK_END)
+                cut_off = file.read(1) != b'\n'
+            else:
+                cut_off = False
+        file = open(output, 'a', newline='')
+        if cut_off:
+            file.write('\n')
+        return file
+
+
+def main(arguments: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='extended-networkx-analytics',
+        description='Scores saved graphs in parallel, and writes the results as JSON Lines or CSV.'
+    )
+    parser.add_argument('paths', nargs='+', help='Graph files, or directories to search for graph files.')
+    parser.add_argument('--output', '-o', default='-', help='File to write the results to. Defaults to stdout.')
+    parser.add_argument('--format', choices=['jsonl', 'csv'],
+                        help='Format of the results. Defaults to csv for .csv files, otherwise jsonl.')
+    parser.add_argument('--metrics', nargs='+', choices=list(BatchAnalytics.metrics),
+                        default=BatchAnalytics.default_metrics, help='Metrics to calculate.')
+    parser.add_argument('--workers', type=int, help='Worker processes. Defaults to the number of CPUs.')
+    parser.add_argument('--resume', action='store_true', help='Skip the graphs already in the output file.')
+    arguments = parser.parse_args(arguments)
+
+    summary = BatchAnalytics.run(arguments.paths, arguments.output, arguments.metrics, arguments.workers,
+                                 arguments.resume, arguments.format)
+    print('Scored {scored} graphs with {errors} errors, skipped {skipped}, in {elapsed:.1f} s'.format(**summary),
+          file=sys.stderr)
+    return 1 if summary['errors'] > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+from typing import Iterable, List, Set, Tuple, Union
+
+
+class BridgeIndex:
+    """
+    Index of the bridges in a graph, which are the edges that would split a component of the graph if
+    they were removed. The index is built from a depth first search in linear time, after which
+    each query takes constant time.
+
+    Each edge of the search tree stores how many of the other edges cover it, which are the edges whose
+    tree path between their nodes goes through it. The bridges are the tree edges that aren't covered. When
+    the end of an edge that isn't in the tree is moved, only the cover counts along two tree paths change,
+    see move_edge(). The index otherwise describes the graph at the time it was created, and has to be
+    recreated after the graph changes.
+    """
+    _parent: List[int]
+    _depth: List[int]
+    _cover: List[int]
+    _preorder: List[int]
+    _subtree_size: List[int]
+    _component: List[int]
+
+    def __init__(self, neighbours: List[Iterable[int]]):
+        """
+        :param neighbours: The neighbours of each node, where the nodes are identified as 0 to n-1.
+        """
+        dimension = len(neighbours)
+        self._parent = [-1] * dimension
+        self._depth = [0] * dimension
+        # The cover of the edge between each node and its parent
+        self._cover = [0] * dimension
+        self._preorder = [-1] * dimension
+        self._subtree_size = [1] * dimension
+        self._component = [-1] * dimension
+
+        counter = 0
+        for root in range(dimension):
+            if self._preorder[root] != -1:
+                continue
+            self._preorder[root] = counter
+            self._component[root] = root
+            counter += 1
+
+            # Iterative depth first search, where each entry is (node, parent, neighbour iterator)
+            stack = [(root, -1, iter(neighbours[root]))]
+            while len(stack) > 0:
+                node, parent, remaining = stack[-1]
+                for neighbour in remaining:
+                    if self._preorder[neighbour] == -1:
+                        self._preorder[neighbour] = counter
+                        self._component[neighbour] = root
+                        self._parent[neighbour] = node
+                        self._depth[neighbour] = self._depth[node] + 1
+                        counter += 1
+                        stack.append((neighbour, node, iter(neighbours[neighbour])))
+                        break
+                    elif neighbour != parent and self._preorder[neighbour] < self._preorder[node]:
+                        # An edge back to an ancestor covers the tree path up to it. It's added at the node
+                        # and subtracted at the ancestor, and the subtree sums below give the covers.
+                        self._cover[node] += 1
+                        self._cover[neighbour] -= 1
+                else:
+                    stack.pop()
+                    if parent != -1:
+                        self._subtree_size[parent] += self._subtree_size[node]
+                        self._cover[parent] += self._cover[node]
+
+    def is_bridge(self, origin: int, destination: int) -> bool:
+        """
+        Checks whether an edge is a bridge.
+
+        :param origin:
+        :param destination:
+        :return: True if removing the edge would split its component, otherwise False.
+        """
+        child = self._get_tree_child(origin, destination)
+        return child is not None and self._cover[child] == 0
+
+    def get_bridges(self) -> Set[Tuple[int, int]]:
+        """
+        :return: All bridges, as (smaller node, larger node).
+        """
+        return {
+            (min(node, parent), max(node, parent))
+            for node, parent in enumerate(self._parent)
+            if parent != -1 and self._cover[node] == 0
+        }
+
+    def move_edge(self, origin: int, old_destination: int, new_destination: int) -> bool:
+        """
+        Updates the index after the end of an edge is moved, if the edge isn't in the search tree and the new
+        destination is in the same component. The tree is then unchanged, and only the covers along the tree
+        paths of the old and the new edge change.
+
+        :param origin:
+        :param old_destination:
+        :param new_destination:
+        :return: True if the index was updated, otherwise False, in which case it has to be recreated.
+        """
+        if self._get_tree_child(origin, old_destination) is not None or \
+                self._component[origin] != self._component[new_destination]:
+            return False
+        self._add_cover(origin, old_destination, -1)
+        self._add_cover(origin, new_destination, 1)
+        return True
+
+    def would_disconnect(self, origin: int, old_destination: int, new_destination: int = None) -> bool:
+        """
+        Checks whether removing an edge, or moving it to a new destination, would split a component of the graph.
+
+        :param origin:
+        :param old_destination:
+        :param new_destination: The new destination of the edge if it's moved, otherwise None.
+        :return: True if the component of the edge would be split, otherwise False.
+        """
+        child = self._get_tree_child(origin, old_destination)
+        if child is None or self._cover[child] > 0:
+            return False
+        if new_destination is None or self._component[new_destination] != self._component[origin]:
+            return True
+
+        # The bridge separates the depth first search subtree of the child from the rest of the component,
+        # so the moved edge reconnects them if it has exactly one end in the subtree
+        start = self._preorder[child]
+        end = start + self._subtree_size[child]
+        return (start <= self._preorder[origin] < end) == (start <= self._preorder[new_destination] < end)
+
+    def _get_tree_child(self, origin: int, destination: int) -> Union[int, None]:
+        """
+        :return: The lower node of the edge if it's in the search tree, otherwise None.
+        """
+        if self._parent[destination] == origin:
+            return destination
+        if self._parent[origin] == destination:
+            return origin
+        return None
+
+    def _add_cover(self, origin: int, destination: int, value: int):
+        """
+        Adds a value to the covers of the tree path between two nodes in the same component.
+        """
+        while origin != destination:
+            if self._depth[origin] < self._depth[destination]:
+                origin, destination = destination, origin
+            self._cover[origin] += value
+            origin = self._parent[origin]
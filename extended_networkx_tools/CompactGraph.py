@@ -0,0 +1,165 @@
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+from scipy import sparse
+
+
+class CompactGraph:
+    """
+    Compact store of the edges and weights of an undirected graph with nodes 0 to n-1. AnalyticsGraph keeps
+    its edges, weights and neighbours here instead of in networkx or sets of neighbours.
+
+    The edges are kept in compressed sparse row form, where the neighbours of each node are a slice of an int32
+    array, with the weights of the edges in the same positions of a weight array. Writing single values to numpy
+    arrays is slow from Python, so added and removed edges are instead written to a log of changed edges, with
+    the changed neighbours of each node. The log is merged into the arrays by compact(), which is done
+    automatically once it holds as many edges as the arrays.
+    """
+    __slots__ = ('_indptr', '_indices', '_weights', '_changes', '_change_count')
+
+    _indptr: np.ndarray
+    _indices: np.ndarray
+    _weights: np.ndarray
+    # The changed neighbours of each node, with the weight of the edge or None if it was removed
+    _changes: Dict[int, Dict[int, Union[int, float, None]]]
+    _change_count: int
+
+    def __init__(self, dimension: int, edges: np.ndarray, weights: Union[np.ndarray, list] = None):
+        """
+        :param dimension: The number of nodes.
+        :param edges: Array of shape (m, 2) with the nodes of each edge.
+        :param weights: The weight of each edge. The weights keep their data type, so integer weights are summed
+                        up exactly. Defaults to weights of 1.
+        """
+        edges = np.asarray(edges, dtype=np.int32).reshape(-1, 2)
+        weights = np.ones(len(edges), dtype=int) if weights is None else np.asarray(weights)
+        if weights.dtype.kind not in 'iuf':
+            weights = weights.astype(float)
+        self._set_arrays(dimension, edges, weights)
+
+    def get_dimension(self) -> int:
+        return len(self._indptr) - 1
+
+    def has_edge(self, origin: int, destination: int) -> bool:
+        return self.get_weight(origin, destination) is not None
+
+    def get_weight(self, origin: int, destination: int) -> Union[int, float, None]:
+        """
+        :param origin:
+        :param destination:
+        :return: The weight of the edge, or None if there is no edge.
+        """
+        changes = self._changes.get(origin)
+        if changes is not None and destination in changes:
+            return changes[destination]
+        start, end = self._indptr[origin:origin + 2].tolist()
+        # Rows are short, where a list search is faster than numpy
+        row = self._indices[start:end].tolist()
+        if destination in row:
+            return self._weights[start + row.index(destination)].item()
+        return None
+
+    def add_edge(self, origin: int, destination: int, weight: Union[int, float] = 1):
+        """
+        Adds an edge, which must not already exist.
+
+        :param origin:
+        :param destination:
+        :param weight:
+        """
+        self._set_change(origin, destination, weight)
+        if self._change_count > max(64, len(self._indices)):
+            self.compact()
+
+    def remove_edge(self, origin: int, destination: int) -> Union[int, float]:
+        """
+        Removes an edge, which must exist.
+
+        :param origin:
+        :param destination:
+        :return: The weight of the removed edge.
+        """
+        weight = self.get_weight(origin, destination)
+        self._set_change(origin, destination, None)
+        return weight
+
+    def get_neighbours(self, node: int) -> List[int]:
+        """
+        :param node:
+        :return: The neighbours of the node.
+        """
+        row = self._indices[self._indptr[node]:self._indptr[node + 1]].tolist()
+        changes = self._changes.get(node)
+        if changes is None:
+            return row
+        return [neighbour for neighbour in row if neighbour not in changes] + \
+               [neighbour for neighbour, weight in changes.items() if weight is not None]
+
+    def get_edges(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: Array of shape (m, 2) with the edges as (smaller node, larger node), and the weight of each edge.
+        """
+        dimension = self.get_dimension()
+        origins = np.repeat(np.arange(dimension, dtype=np.int32), np.diff(self._indptr))
+        once = origins <= self._indices
+        edges = np.column_stack((origins[once], self._indices[once]))
+        weights = self._weights[once]
+        if self._change_count == 0:
+            return edges, weights
+
+        changes = [
+            (origin, destination, weight) for origin, row in self._changes.items()
+            for destination, weight in row.items() if origin <= destination
+        ]
+        changed = np.array([change[:2] for change in changes], dtype=np.int32).reshape(-1, 2)
+        unchanged = ~np.isin(edges[:, 0].astype(np.int64) * dimension + edges[:, 1],
+                             changed[:, 0].astype(np.int64) * dimension + changed[:, 1])
+        added = np.array([weight is not None for _, _, weight in changes], dtype=bool)
+        if added.any():
+            added_weights = np.array([weight for _, _, weight in changes if weight is not None])
+        else:
+            added_weights = np.empty(0, dtype=weights.dtype)
+        if len(self._weights) == 0:
+            # An empty weight array has no weights to take the data type from, so it's taken from the added ones
+            weights = weights.astype(added_weights.dtype)
+        return np.concatenate((edges[unchanged], changed[added])), np.concatenate((weights[unchanged], added_weights))
+
+    def tocsr(self) -> sparse.csr_matrix:
+        """
+        :return: The adjacency matrix of the graph as a scipy CSR matrix, with a 1 for each edge.
+        """
+        self.compact()
+        dimension = self.get_dimension()
+        return sparse.csr_matrix(
+            (np.ones(len(self._indices), dtype=int), self._indices, self._indptr), shape=(dimension, dimension)
+        )
+
+    def compact(self):
+        """
+        Merges the log of changed edges into the arrays.
+        """
+        if self._change_count > 0:
+            edges, weights = self.get_edges()
+            self._set_arrays(self.get_dimension(), edges, weights)
+
+    def _set_change(self, origin: int, destination: int, weight: Union[int, float, None]):
+        changes = self._changes.setdefault(origin, {})
+        if destination not in changes:
+            self._change_count += 1
+        changes[destination] = weight
+        if origin != destination:
+            self._changes.setdefault(destination, {})[origin] = weight
+
+    def _set_arrays(self, dimension: int, edges: np.ndarray, weights: np.ndarray):
+        # Store each edge at both its nodes, except self loops which are only stored once
+        loops = edges[:, 0] == edges[:, 1]
+        origins = np.concatenate((edges[:, 0], edges[~loops, 1]))
+        destinations = np.concatenate((edges[:, 1], edges[~loops, 0]))
+        weights = np.concatenate((weights, weights[~loops]))
+
+        order = np.argsort(origins, kind='stable')
+        self._indptr = np.concatenate(([0], np.cumsum(np.bincount(origins, minlength=dimension))))
+        self._indices = destinations[order].astype(np.int32)
+        self._weights = weights[order]
+        self._changes = {}
+        self._change_count = 0
@@ -1,7 +1,13 @@
-from typing import Dict, Set, List, Tuple
+import numbers
+import random
+from typing import Dict, List, Tuple, Union
 
 import networkx
-from random import randint
+import numpy as np
+try:
+    from WeightCache import WeightCache
+except ImportError:
+    from .WeightCache import WeightCache
 
 
 class Creator:
@@ -12,14 +18,24 @@ class Creator:
     """
 
     @staticmethod
-    def from_random(node_count: int, area_dimension: int = None) -> networkx.Graph:
+    def from_random(node_count: int, area_dimension: int = None,
+                    seed: Union[int, np.random.Generator] = None,
+                    as_array: bool = False) -> Union[networkx.Graph, np.ndarray]:
         """
         Creates an unassigned graph with nodes of random position.
         The work area corresponds to the node count squared.
 
+        The positions are drawn at once without replacement from all cells of the area,
+        so no two nodes share a position.
+
         :rtype: networkx.Graph
         :param node_count: The number of nodes to create a graph from.
         :param area_dimension: The size of the area to put nodes in. Defaults to the node count.
+        :param seed: Seed or numpy random Generator to draw the positions with, for reproducible graphs.
+                     Defaults to a seed drawn from the random module, so random.seed() still makes the graphs
+                     reproducible, although they differ from the ones of earlier versions.
+        :param as_array: Whether to return the positions as an array of shape (node_count, 2) instead
+                         of a graph, where row i holds the x and y coordinate of node i.
         :return: An unassigned graph with nodes with random position.
         """
         if area_dimension is None:
@@ -29,19 +45,18 @@ class Creator:
         if (area_dimension*area_dimension) < node_count:
             raise ValueError("area_dimension must be at least the size of sqrt(node_count)")
 
-        nxg: networkx.Graph = networkx.Graph()
-
-        node_set: Set[str] = set()
+        if seed is None:
+            seed = random.getrandbits(64)
+        rng = np.random.default_rng(seed)
+        cells = rng.choice(area_dimension * area_dimension, node_count, replace=False)
+        coordinates = np.stack(np.divmod(cells, area_dimension), axis=1)
+        if as_array:
+            return coordinates
 
-        for node_id in range(0, node_count):
-            coord_x = None
-            coord_y = None
-            # Keep finding new coordinates until a new one is found
-            while coord_x is None or coord_y is None or str((coord_x, coord_y)) in node_set:
-                coord_x = randint(0, area_dimension-1)
-                coord_y = randint(0, area_dimension-1)
-            nxg.add_node(node_id, x=coord_x, y=coord_y)
-            node_set.add(str((coord_x, coord_y)))
+        nxg: networkx.Graph = networkx.Graph()
+        nxg.add_nodes_from(
+            (node_id, {'x': coord_x, 'y': coord_y}) for node_id, (coord_x, coord_y) in enumerate(coordinates.tolist())
+        )
 
         return nxg
 
@@ -58,21 +73,85 @@ class Creator:
         :rtype: networkx.Graph
         """
         nxg = networkx.Graph()
+        nxg.add_nodes_from((node_id, {'x': node[0], 'y': node[1]}) for node_id, node in v.items())
+
+        nodes = list(v.keys())
+        node_index = {node_id: index for index, node_id in enumerate(nodes)}
+        coordinates = [tuple(node[:2]) for node in v.values()]
+        integral = [isinstance(value, numbers.Integral) for coordinate in coordinates for value in coordinate]
+        # Numpy would turn a mix of integers and floats into floats, so the weights of edges between integer
+        # coordinates would become floats. Python objects keep the same weights as add_weighted_edge().
+        coordinates = np.array(coordinates, dtype=None if all(integral) or not any(integral) else object)
+        coordinates = coordinates.reshape(-1, 2)
+        edges = np.fromiter(
+            (node_index[node_id] for origin, destinations in e.items()
+             for destination in destinations for node_id in (origin, destination)),
+            dtype=np.intp
+        ).reshape(-1, 2)
+        Creator._add_weighted_edges(nxg, coordinates, edges, nodes)
 
-        for node_id, node in v.items():
-            nxg.add_node(node_id, x=node[0], y=node[1])
+        return nxg
 
-        for origin, destinations in e.items():
-            for destination in destinations:
-                Creator.add_weighted_edge(nxg, origin, destination)
+    @staticmethod
+    def from_arrays(coordinates: np.ndarray, edges: np.ndarray = None, nodes: List = None) -> networkx.Graph:
+        """
+        Creates a graph from arrays of node coordinates and edges, with the same weights as add_weighted_edge().
+        Node i is placed at row i of the coordinates.
 
+        :param coordinates: Array of shape (n, 2) with the x and y coordinate of each node.
+        :param edges: Array of shape (m, 2) with the rows of the coordinates that each edge connects. Repeated
+                      edges, in either direction, are only added once.
+        :param nodes: The node id of each row of the coordinates. Defaults to the row index.
+        :return: A graph with assigned nodes and weighted edges.
+        :rtype: networkx.Graph
+        """
+        coordinates = np.asarray(coordinates).reshape(-1, 2)
+        if nodes is not None:
+            nodes = list(nodes)
+        nxg = networkx.Graph()
+        nxg.add_nodes_from(
+            (node_id, {'x': coord_x, 'y': coord_y})
+            for node_id, (coord_x, coord_y) in zip(nodes or range(len(coordinates)), coordinates.tolist())
+        )
+        if edges is not None:
+            Creator._add_weighted_edges(nxg, coordinates, np.asarray(edges, dtype=np.intp).reshape(-1, 2), nodes)
         return nxg
 
+    @staticmethod
+    def _add_weighted_edges(nxg: networkx.Graph, coordinates: np.ndarray, edges: np.ndarray, nodes: List = None):
+        """
+        Adds edges with their weights calculated in one pass, keeping the first of any repeated edges.
+
+        :param nxg: The graph to add the edges to.
+        :param coordinates: Array of shape (n, 2) with the coordinates of the nodes.
+        :param edges: Array of shape (m, 2) with the rows of the coordinates that each edge connects.
+        :param nodes: The node id of each row of the coordinates. Defaults to the row index.
+        """
+        if len(edges) == 0:
+            return
+
+        # Identify each undirected edge by its ordered pair, and keep the first occurrence in the given order
+        low = np.minimum(edges[:, 0], edges[:, 1])
+        high = np.maximum(edges[:, 0], edges[:, 1])
+        _, first = np.unique(low * len(coordinates) + high, return_index=True)
+        edges = edges[np.sort(first)]
+
+        delta = coordinates[edges[:, 0]] - coordinates[edges[:, 1]]
+        weights = delta[:, 0] * delta[:, 0] + delta[:, 1] * delta[:, 1]
+
+        edges = edges.tolist()
+        if nodes is not None:
+            edges = [(nodes[origin], nodes[destination]) for origin, destination in edges]
+        nxg.add_edges_from(
+            (origin, destination, {'weight': weight}) for (origin, destination), weight in zip(edges, weights.tolist())
+        )
+
     @staticmethod
     def add_weighted_edge(nxg: networkx.Graph, origin: int, destination: int, ignore_validity: bool = False) -> bool:
         """
         Adds a bidirectional edge between 2 nodes with weight corresponding to the
-        distance between the nodes squared.
+        distance between the nodes squared. The weight is read from the WeightCache
+        of the graph if one is attached.
 
         :param nxg: The graph to add an edge to.
         :param origin: First node id to add the edge from
@@ -84,18 +163,29 @@ class Creator:
             if nxg.has_edge(origin, destination):
                 return False
 
-        # Find start and end coordinates
-        start_coord = (nxg.node[origin]['x'], nxg.node[origin]['y'])
-        destination_coord = (nxg.node[destination]['x'], nxg.node[destination]['y'])
-
-        # Subtract the coordinate values of the two points
-        delta = tuple(map(lambda n: pow(n[0] - n[1], 2), zip(start_coord, destination_coord)))
-        # Extract values from delta tuple
-        delta_x, delta_y = delta
-        # Cost is the summation of the difference in x and y of the two coordinates
-        weight = delta_x + delta_y
-
         # Add edge to graph with its corresponding weight
-        nxg.add_edge(origin, destination, weight=weight)
+        nxg.add_edge(origin, destination, weight=Creator.get_edge_weight(nxg, origin, destination))
 
         return True
+
+    @staticmethod
+    def get_edge_weight(nxg: networkx.Graph, origin: int, destination: int) -> Union[int, float]:
+        """
+        Calculates the weight of an edge between 2 nodes, which is the distance between the nodes squared.
+        The weight is read from the WeightCache of the graph if one is attached.
+
+        :param nxg: The graph with the nodes.
+        :param origin: First node id of the edge.
+        :param destination: Second node id of the edge.
+        :return: The weight of the edge.
+        """
+        weight_cache = WeightCache.get(nxg)
+        if weight_cache is not None:
+            return weight_cache.get_weight(origin, destination)
+
+        # Cost is the summation of the squared difference in x and y of the two coordinates
+        start = nxg.node[origin]
+        end = nxg.node[destination]
+        delta_x = start['x'] - end['x']
+        delta_y = start['y'] - end['y']
+        return delta_x * delta_x + delta_y * delta_y
@@ -0,0 +1,174 @@
+from typing import Callable, Iterable, List, Set, Tuple, Union
+
+import numpy as np
+
+try:
+    from Instrumentation import Instrumentation
+except ImportError:
+    from .Instrumentation import Instrumentation
+
+
+class DynamicConnectivity:
+    """
+    Keeps track of whether a graph is connected while edges are added and removed, without
+    searching the whole graph after each change.
+
+    A spanning forest of the graph is maintained next to its edges. Removing an edge that isn't part
+    of the forest, or adding an edge within a connected graph, can't change the connectivity and takes
+    constant time. Removing a forest edge splits a tree in two, after which the smaller half is searched
+    for a replacement edge that reconnects them, which takes time proportional to the smaller half.
+
+    The neighbours of each node are either kept in sets, or read from the graph through a function, such as
+    CompactGraph.get_neighbours(), so they aren't stored twice. The graph then has to be changed before each
+    call to add_edge() and remove_edge().
+    """
+    _neighbours: Union[List[Set[int]], None]
+    _neighbour_function: Union[Callable[[int], Iterable[int]], None]
+    _tree: List[Set[int]]
+    _component_count: int
+
+    def __init__(self, dimension: int, edges: np.ndarray = None,
+                 neighbours: Callable[[int], Iterable[int]] = None):
+        """
+        :param dimension: The number of nodes, which are identified as 0 to dimension-1.
+        :param edges: Array of shape (m, 2) with the edges of the graph, if the neighbours aren't given.
+        :param neighbours: Function that returns the neighbours of a node in the graph.
+        """
+        self._tree = [set() for _ in range(dimension)]
+        self._neighbour_function = neighbours
+        self._neighbours = None
+        if neighbours is None:
+            self._neighbours = [set() for _ in range(dimension)]
+            for origin, destination in np.asarray(edges).tolist():
+                if origin != destination:
+                    self._neighbours[origin].add(destination)
+                    self._neighbours[destination].add(origin)
+
+        # Build a spanning forest with one BFS per component
+        self._component_count = 0
+        seen = [False] * dimension
+        for root in range(dimension):
+            if seen[root]:
+                continue
+            self._component_count += 1
+            seen[root] = True
+            queue = [root]
+            for node in queue:
+                for neighbour in self.get_neighbours(node):
+                    if not seen[neighbour]:
+                        seen[neighbour] = True
+                        self._tree[node].add(neighbour)
+                        self._tree[neighbour].add(node)
+                        queue.append(neighbour)
+
+    def is_connected(self) -> bool:
+        """
+        :return: Whether the graph consists of a single component.
+        """
+        return self._component_count <= 1
+
+    def get_component_count(self) -> int:
+        """
+        :return: The number of connected components in the graph.
+        """
+        return self._component_count
+
+    def get_neighbours(self, node: int) -> Iterable[int]:
+        """
+        :param node:
+        :return: The neighbours of the node. The returned collection must not be modified.
+        """
+        if self._neighbours is None:
+            return self._neighbour_function(node)
+        return self._neighbours[node]
+
+    def is_nodes_connected(self, origin: int, destination: int) -> bool:
+        """
+        Checks whether there is a path between two nodes.
+
+        :param origin:
+        :param destination:
+        :return: True if the nodes are in the same component, otherwise False.
+        """
+        if self._component_count <= 1 or origin == destination:
+            return True
+        connected, _ = self._search_tree(origin, destination)
+        return connected
+
+    def add_edge(self, origin: int, destination: int):
+        """
+        Adds an edge to the graph.
+
+        :param origin:
+        :param destination:
+        """
+        if origin == destination:
+            return
+        if self._neighbours is not None:
+            if destination in self._neighbours[origin]:
+                return
+            self._neighbours[origin].add(destination)
+            self._neighbours[destination].add(origin)
+
+        # An edge between two trees joins them
+        if not self.is_nodes_connected(origin, destination):
+            self._tree[origin].add(destination)
+            self._tree[destination].add(origin)
+            self._component_count -= 1
+
+    def remove_edge(self, origin: int, destination: int):
+        """
+        Removes an edge from the graph.
+
+        :param origin:
+        :param destination:
+        """
+        if self._neighbours is not None:
+            if destination not in self._neighbours[origin]:
+                return
+            self._neighbours[origin].discard(destination)
+            self._neighbours[destination].discard(origin)
+
+        # The forest is still spanning if the edge wasn't part of it
+        if destination not in self._tree[origin]:
+            return
+        self._tree[origin].discard(destination)
+        self._tree[destination].discard(origin)
+
+        # Look for an edge from the smaller half of the split tree to the other half
+        _, component = self._search_tree(origin, destination)
+        for node in component:
+            for neighbour in self.get_neighbours(node):
+                if neighbour not in component:
+                    self._tree[node].add(neighbour)
+                    self._tree[neighbour].add(node)
+                    return
+
+        self._component_count += 1
+
+    @Instrumentation.timed('dynamic_connectivity.search_tree')
+    def _search_tree(self, origin: int, destination: int) -> Tuple[bool, Set[int]]:
+        """
+        Searches the forest from both nodes at the same pace, until either the searches meet or one of
+        them has visited its whole tree.
+
+        :param origin:
+        :param destination:
+        :return: Whether the nodes are in the same tree, and if not, the nodes of the smaller tree.
+        """
+        seen = ({origin}, {destination})
+        queues = ([origin], [destination])
+        positions = [0, 0]
+        while True:
+            for side in (0, 1):
+                queue = queues[side]
+                if positions[side] == len(queue):
+                    return False, seen[side]
+                node = queue[positions[side]]
+                positions[side] += 1
+                for neighbour in self._tree[node]:
+                    if neighbour in seen[1 - side]:
+                        return True, set()
+                    if neighbour not in seen[side]:
+                        seen[side].add(neighbour)
+                        queue.append(neighbour)
@@ -0,0 +1,214 @@
+from typing import Any, Dict, Tuple
+
+import networkx as nx
+import numpy as np
+from numba import njit, prange
+
+try:
+    from Analytics import Analytics
+except ImportError:
+    from .Analytics import Analytics
+
+
+class Eccentricity:
+    """
+    Calculates the eccentricity of all nodes with a breadth first search from each node, compiled with numba
+    and run in parallel over the nodes. The graph is converted to compressed sparse row arrays first, so the
+    searches don't touch networkx.
+
+    The results are the same as with networkx.eccentricity(), which is also pure Python and much slower.
+    For graphs that are too large for a search from each node, get_bounds() estimates the diameter and average
+    eccentricity from a few searches.
+    This module imports numba, so it's only imported by Analytics when it's first used.
+    """
+
+    @staticmethod
+    def get_eccentricities(nxg: nx.Graph) -> Dict[int, int]:
+        """
+        Calculates the eccentricity of each node, which is its largest shortest path length to another node.
+
+        :param nxg: The graph.
+        :return: The eccentricity of each node, in the order of the nodes of the graph.
+        :raises networkx.NetworkXError: If the graph isn't connected, or for a directed graph, strongly connected.
+        """
+        node_index = Analytics.get_node_index(nxg)
+        indptr, indices = Eccentricity.get_csr_arrays(nxg, node_index)
+        eccentricities = Eccentricity.get_eccentricity_array(indptr, indices)
+        if np.any(eccentricities < 0):
+            if nxg.is_directed():
+                raise nx.NetworkXError('Found infinite path length because the digraph is not strongly connected')
+            raise nx.NetworkXError('Found infinite path length because the graph is not connected')
+
+        eccentricities = eccentricities.tolist()
+        return {node: eccentricities[node_index[node]] for node in nxg}
+
+    @staticmethod
+    def get_csr_arrays(nxg: nx.Graph, node_index: Dict[int, int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Creates the compressed sparse row arrays of the neighbours of each node, where the neighbours of
+        the node with matrix index i are indices[indptr[i]:indptr[i + 1]]. Directed graphs only have the
+        successors as neighbours.
+
+        :param nxg: The graph.
+        :param node_index: Optional precomputed mapping from node id to matrix index, see
+                           Analytics.get_node_index().
+        :return: The arrays indptr and indices.
+        """
+        if node_index is None:
+            node_index = Analytics.get_node_index(nxg)
+        edges = Analytics.get_edge_array(nxg, node_index)
+        if not nxg.is_directed():
+            edges = np.concatenate((edges, edges[:, ::-1]))
+        edges = edges[np.argsort(edges[:, 0], kind='stable')]
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(edges[:, 0], minlength=len(node_index)))))
+        return indptr.astype(np.int64), edges[:, 1].astype(np.int32)
+
+    @staticmethod
+    def get_eccentricity_array(indptr: np.ndarray, indices: np.ndarray) -> np.ndarray:
+        """
+        Calculates the eccentricity of each node of a graph in compressed sparse row form.
+
+        :param indptr: See get_csr_arrays().
+        :param indices: See get_csr_arrays().
+        :return: The eccentricity of each node, or -1 for the nodes that can't reach all other nodes.
+        """
+        return _get_eccentricities(indptr, indices)
+
+    @staticmethod
+    def get_bounds(nxg: nx.Graph, searches: int = 20, samples: int = None, seed: int = None) -> Dict[str, Any]:
+        """
+        Estimates the diameter and average eccentricity of a large undirected graph from a limited number of
+        breadth first searches, instead of one from each node.
+
+        Each search from a node s gives its exact eccentricity e(s) and distances d(s, v), which bound the
+        eccentricity of every other node to max(d(s, v), e(s) - d(s, v)) <= e(v) <= e(s) + d(s, v). The sources
+        alternate between the node with the largest upper bound and the node with the smallest lower bound,
+        starting from the node with the highest degree, so the first two searches are a double sweep. The last
+        searches are from random nodes whose bounds aren't equal yet, and the average difference between their
+        eccentricity and lower bound is added to the lower bounds of the other such nodes for the estimate.
+
+        The searches stop early once all bounds are equal, in which case the results are exact.
+
+        :param nxg: The graph, which needs to be connected.
+        :param searches: The largest number of breadth first searches. More searches give tighter bounds.
+        :param samples: How many of the searches are from random nodes. Defaults to a quarter of them.
+        :param seed: Seed of the random nodes.
+        :return: The estimated 'diameter' and 'average_eccentricity', their lower and upper bounds as
+                 'diameter_bounds' and 'average_eccentricity_bounds', the number of 'searches' that were done, and
+                 whether the results are 'exact'.
+        :raises networkx.NetworkXError: If the graph isn't connected.
+        """
+        if nxg.is_directed():
+            raise ValueError('The bounds can only be calculated for undirected graphs')
+        if nxg.number_of_nodes() == 0:
+            raise ValueError('The graph needs at least one node')
+        if searches < 1:
+            raise ValueError('There needs to be at least one search')
+        samples = searches // 4 if samples is None else min(samples, searches)
+
+        indptr, indices = Eccentricity.get_csr_arrays(nxg)
+        node_count = len(indptr) - 1
+        degrees = np.diff(indptr)
+        lower = np.zeros(node_count, dtype=np.int64)
+        upper = np.full(node_count, np.iinfo(np.int64).max // 2, dtype=np.int64)
+        random = np.random.RandomState(seed)
+
+        def search(source: int):
+            distances = _get_distances(indptr, indices, source)
+            if np.any(distances < 0):
+                raise nx.NetworkXError('Found infinite path length because the graph is not connected')
+            eccentricity = distances.max()
+            np.maximum(lower, np.maximum(distances, eccentricity - distances), out=lower)
+            np.minimum(upper, eccentricity + distances, out=upper)
+
+        count = 0
+        while count < searches - samples and np.any(lower < upper):
+            unresolved = lower < upper
+            if count == 0:
+                source = np.argmax(degrees)
+            elif count % 2 == 1:
+                # The highest degree of the nodes with the largest upper bound
+                candidates = unresolved & (upper == upper[unresolved].max())
+                source = np.argmax(np.where(candidates, degrees, -1))
+            else:
+                candidates = unresolved & (lower == lower[unresolved].min())
+                source = np.argmax(np.where(candidates, degrees, -1))
+            search(source)
+            count += 1
+
+        # Sample the nodes that aren't resolved by the searches above, with their lower bounds before the samples
+        unresolved = np.flatnonzero(lower < upper)
+        sampled = random.choice(unresolved, min(samples, len(unresolved), searches - count), replace=False)
+        sampled_lower = lower[sampled]
+        estimated_sum = lower.sum()
+        for source in sampled:
+            search(source)
+        count += len(sampled)
+        if len(sampled) > 0:
+            estimated_sum += len(unresolved) * (lower[sampled] - sampled_lower).mean()
+
+        lower_average = lower.mean()
+        upper_average = upper.mean()
+        return {
+            'diameter': int(lower.max()),
+            'diameter_bounds': (int(lower.max()), int(upper.max())),
+            'average_eccentricity': float(min(max(estimated_sum / node_count, lower_average), upper_average)),
+            'average_eccentricity_bounds': (float(lower_average), float(upper_average)),
+            'searches': count,
+            'exact': bool(np.all(lower == upper)),
+        }
+
+
+# The number of searches that share the same buffers
+_block_size = 64
+
+
+@njit(parallel=True, cache=True)
+def _get_eccentricities(indptr, indices):
+    node_count = len(indptr) - 1
+    eccentricities = np.empty(node_count, dtype=np.int64)
+    for block in prange((node_count + _block_size - 1) // _block_size):
+        queue = np.empty(node_count, dtype=np.int32)
+        # The last source each node was seen from, so it doesn't have to be reset between searches
+        seen_from = np.full(node_count, -1, dtype=np.int64)
+        for source in range(block * _block_size, min(node_count, (block + 1) * _block_size)):
+            queue[0] = source
+            seen_from[source] = source
+            head = 0
+            tail = 1
+            level_end = 1
+            level = 0
+            while head < tail:
+                node = queue[head]
+                head += 1
+                for position in range(indptr[node], indptr[node + 1]):
+                    neighbour = indices[position]
+                    if seen_from[neighbour] != source:
+                        seen_from[neighbour] = source
+                        queue[tail] = neighbour
+                        tail += 1
+                if head == level_end and head < tail:
+                    level += 1
+                    level_end = tail
+            eccentricities[source] = level if tail == node_count else -1
+    return eccentricities
+
+
+@njit(cache=True)
+def _get_distances(indptr, indices, source):
+    distances = np.full(len(indptr) - 1, -1, dtype=np.int64)
+    queue = np.empty(len(indptr) - 1, dtype=np.int32)
+    queue[0] = source
+    distances[source] = 0
+    head = 0
+    tail = 1
+    while head < tail:
+        node = queue[head]
+        head += 1
+        for position in range(indptr[node], indptr[node + 1]):
+            neighbour = indices[position]
+            if distances[neighbour] < 0:
+                distances[neighbour] = distances[node] + 1
+                queue[tail] = neighbour
+                tail += 1
+    return distances
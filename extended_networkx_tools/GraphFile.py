@@ -0,0 +1,151 @@
+import struct
+from typing import Tuple, Union
+
+import networkx as nx
+import numpy as np
+
+try:
+    from Analytics import Analytics
+    from Creator import Creator
+except ImportError:
+    from .Analytics import Analytics
+    from .Creator import Creator
+
+
+class GraphFile:
+    """
+    Static class that saves and loads the node coordinates and edges of graphs in a compact binary format, as
+    an alternative to Analytics.get_node_dict() and get_edge_dict().
+
+    A file has a header of 64 bytes, followed by the coordinates as an (n, 2) array, the edges as an (m, 2)
+    array of node indices, and optionally the node ids as an (n,) array when they aren't 0 to n-1. Each array is
+    stored little-endian from an offset that is a multiple of 64 bytes, so it can be memory mapped. Opening a
+    memory mapped file takes constant time, and worker processes that open the same file share its pages.
+
+    Edge weights aren't stored, since they are the squared distances between the nodes, see
+    Creator.add_weighted_edge().
+
+    **Example usage**::
+
+        GraphFile.save('graph.enxg', nxg)
+        nxg = GraphFile.load('graph.enxg')
+        coordinates, edges, node_ids = GraphFile.load_arrays('graph.enxg')    # Memory mapped, read-only
+    """
+    _magic = b'ENXG'
+    _version = 1
+    # Magic, version, flags, node count, edge count, coordinate data type and edge data type
+    _header = struct.Struct('<4sHHQQ8s8s')
+    _header_size = 64
+    _alignment = 64
+    _has_node_ids = 1
+
+    @staticmethod
+    def save(path: str, nxg: nx.Graph):
+        """
+        Saves the node coordinates and edges of a graph.
+
+        :param path: The file to write.
+        :param nxg: The graph, where each node has an 'x' and a 'y' coordinate.
+        """
+        node_index = Analytics.get_node_index(nxg)
+        node_ids = np.array(list(node_index), dtype=np.int64)
+        if np.array_equal(node_ids, np.arange(len(node_ids))):
+            node_ids = None
+        GraphFile.save_arrays(
+            path,
+            Analytics.get_coordinate_array(nxg, node_index),
+            Analytics.get_edge_array(nxg, node_index),
+            node_ids
+        )
+
+    @staticmethod
+    def save_arrays(path: str, coordinates: np.ndarray, edges: np.ndarray = None, node_ids: np.ndarray = None):
+        """
+        Saves node coordinates and edges.
+
+        :param path: The file to write.
+        :param coordinates: Array of shape (n, 2) with the x and y coordinate of each node.
+        :param edges: Array of shape (m, 2) with the indices of the nodes of each edge.
+        :param node_ids: The node id of each node, if they aren't 0 to n-1.
+        """
+        coordinates = np.asarray(coordinates).reshape(-1, 2)
+        if coordinates.dtype.kind not in 'if':
+            coordinates = coordinates.astype(float)
+        coordinates = coordinates.astype(coordinates.dtype.newbyteorder('<'))
+        node_count = len(coordinates)
+
+        edges = np.zeros((0, 2)) if edges is None else np.asarray(edges).reshape(-1, 2)
+        if len(edges) > 0 and (edges.min() < 0 or edges.max() >= node_count):
+            raise ValueError('The edges need to be indices of the coordinates')
+        edges = edges.astype('<i4' if node_count < 2 ** 31 else '<i8')
+
+        flags = 0
+        if node_ids is not None:
+            node_ids = np.asarray(node_ids).astype('<i8').reshape(-1)
+            if len(node_ids) != node_count:
+                raise ValueError('There needs to be one node id for each coordinate')
+            flags |= GraphFile._has_node_ids
+
+        header = GraphFile._header.pack(
+            GraphFile._magic, GraphFile._version, flags, node_count, len(edges),
+            coordinates.dtype.str.encode(), edges.dtype.str.encode()
+        )
+        with open(path, 'wb') as file:
+            file.write(header.ljust(GraphFile._header_size, b'\0'))
+            for array in (coordinates, edges, node_ids):
+                if array is not None:
+                    file.write(np.ascontiguousarray(array).tobytes())
+                    file.write(b'\0' * (-file.tell() % GraphFile._alignment))
+
+    @staticmethod
+    def load(path: str) -> nx.Graph:
+        """
+        Loads a graph, with the same weights as Creator.add_weighted_edge().
+
+        :param path: The file to read.
+        :return: The graph.
+        """
+        coordinates, edges, node_ids = GraphFile.load_arrays(path, mmap=False)
+        return Creator.from_arrays(coordinates, edges, None if node_ids is None else node_ids.tolist())
+
+    @staticmethod
+    def load_arrays(path: str, mmap: bool = True) -> Tuple[np.ndarray, np.ndarray, Union[np.ndarray, None]]:
+        """
+        Loads node coordinates and edges.
+
+        :param path: The file to read.
+        :param mmap: Whether to memory map the arrays read-only instead of reading them into memory.
+        :return: The coordinates as an (n, 2) array, the edges as an (m, 2) array of node indices, and the node ids
+                 as an (n,) array, or None if they are 0 to n-1.
+        """
+        with open(path, 'rb') as file:
+            header = file.read(GraphFile._header_size)
+        if len(header) < GraphFile._header_size or header[:4] != GraphFile._magic:
+            raise ValueError('{} is not a graph file'.format(path))
+        _, version, flags, node_count, edge_count, coordinate_dtype, edge_dtype = \
+            GraphFile._header.unpack_from(header)
+        if version > GraphFile._version:
+            raise ValueError('{} has version {}, which is newer than the supported version {}'.format(
+                path, version, GraphFile._version
+            ))
+
+        shapes = [(np.dtype(coordinate_dtype.rstrip(b'\0').decode()), (node_count, 2)),
+                  (np.dtype(edge_dtype.rstrip(b'\0').decode()), (edge_count, 2))]
+        if flags & GraphFile._has_node_ids:
+            shapes.append((np.dtype('<i8'), (node_count,)))
+
+        arrays = []
+        offset = GraphFile._header_size
+        for dtype, shape in shapes:
+            size = dtype.itemsize * int(np.prod(shape))
+            if size == 0:
+                arrays.append(np.zeros(shape, dtype=dtype))
+            elif mmap:
+                arrays.append(np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape))
+            else:
+                arrays.append(np.fromfile(path, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape))
+            offset += size + (-size % GraphFile._alignment)
+
+        if len(arrays) == 2:
+            arrays.append(None)
+        return arrays[0], arrays[1], arrays[2]
@@ -0,0 +1,174 @@
+import functools
+import math
+import time
+from typing import Callable, Dict, List, Union
+
+
+class Instrumentation:
+    """
+    Opt-in counters and timing histograms of the operations in the package, such as how often
+    AnalyticsGraph reuses its cached convergence rate, and how long the eigenvalue solves take.
+
+    Instrumentation is disabled by default, where each instrumented operation only checks a flag.
+    Timings are kept as histograms with power of two buckets of microseconds.
+
+    **Example usage**::
+
+        Instrumentation.enable(exporter=print, interval=60)   # Prints a snapshot at most once a minute
+        ...
+        snapshot = Instrumentation.snapshot()
+        snapshot['counters']['analytics_graph.convergence_rate.hit']
+        snapshot['timings']['analytics.get_eigenpairs']['total']
+
+    Counters and timings are shared by all threads without locking, so concurrent updates may be lost.
+    """
+    enabled: bool = False
+
+    _counters: Dict[str, int] = {}
+    _timings: Dict[str, List] = {}
+    _exporter: Union[Callable[[Dict], None], None] = None
+    _interval: Union[float, None] = None
+    _last_export: float = 0
+
+    # The number of histogram buckets, where bucket i holds times up to 2^i microseconds
+    _bucket_count = 32
+
+    @staticmethod
+    def enable(exporter: Callable[[Dict], None] = None, interval: float = None):
+        """
+        Starts collecting counters and timings.
+
+        :param exporter: Function that is called with a snapshot(), by export() or every interval.
+        :param interval: The smallest number of seconds between automatic exports. Defaults to only
+                         exporting when export() is called.
+        """
+        Instrumentation._exporter = exporter
+        Instrumentation._interval = interval
+        Instrumentation._last_export = time.perf_counter()
+        Instrumentation.enabled = True
+
+    @staticmethod
+    def disable():
+        """
+        Stops collecting counters and timings. What has been collected is kept until reset().
+        """
+        Instrumentation.enabled = False
+
+    @staticmethod
+    def reset():
+        """
+        Removes all collected counters and timings.
+        """
+        Instrumentation._counters = {}
+        Instrumentation._timings = {}
+
+    @staticmethod
+    def count(name: str, value: int = 1):
+        """
+        Increases a counter. Callers on hot paths should check Instrumentation.enabled first.
+
+        :param name: The name of the counter.
+        :param value: The amount to increase it by.
+        """
+        if not Instrumentation.enabled:
+            return
+        Instrumentation._counters[name] = Instrumentation._counters.get(name, 0) + value
+        Instrumentation._export_on_interval()
+
+    @staticmethod
+    def start() -> float:
+        """
+        Starts timing an operation, which is ended by stop().
+
+        :return: The start time, or 0 if instrumentation is disabled.
+        """
+        return time.perf_counter() if Instrumentation.enabled else 0
+
+    @staticmethod
+    def stop(name: str, start: float):
+        """
+        Records the time of an operation started by start().
+
+        :param name: The name of the operation.
+        :param start: The start time returned by start().
+        """
+        if start == 0 or not Instrumentation.enabled:
+            return
+        Instrumentation.record(name, time.perf_counter() - start)
+
+    @staticmethod
+    def timed(name: str) -> Callable:
+        """
+        Decorator that records the time of each call to a function. When disabled it adds one function call
+        and a flag check, so it's meant for operations that take at least microseconds.
+
+        :param name: The name of the operation.
+        """
+        def decorator(function: Callable) -> Callable:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not Instrumentation.enabled:
+                    return function(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    Instrumentation.record(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def record(name: str, seconds: float):
+        """
+        Records the time of an operation.
+
+        :param name: The name of the operation.
+        :param seconds: The time it took.
+        """
+        timing = Instrumentation._timings.get(name)
+        if timing is None:
+            # Count, total, min, max and the histogram buckets
+            timing = [0, 0.0, math.inf, 0.0, [0] * Instrumentation._bucket_count]
+            Instrumentation._timings[name] = timing
+        timing[0] += 1
+        timing[1] += seconds
+        timing[2] = min(timing[2], seconds)
+        timing[3] = max(timing[3], seconds)
+        microseconds = seconds * 1e6
+        bucket = math.ceil(math.log2(microseconds)) if microseconds > 1 else 0
+        timing[4][min(bucket, Instrumentation._bucket_count - 1)] += 1
+        Instrumentation._export_on_interval()
+
+    @staticmethod
+    def snapshot() -> Dict[str, Dict]:
+        """
+        :return: A copy of all counters, and a summary of each timing with its count, total, min, mean and
+                 max in seconds, and a histogram mapping the upper bound of each bucket in seconds to its
+                 count.
+        """
+        timings = {}
+        for name, (count, total, minimum, maximum, buckets) in Instrumentation._timings.items():
+            timings[name] = {
+                'count': count,
+                'total': total,
+                'min': minimum,
+                'mean': total / count,
+                'max': maximum,
+                'histogram': {2 ** bucket / 1e6: value for bucket, value in enumerate(buckets) if value > 0},
+            }
+        return {'counters': dict(Instrumentation._counters), 'timings': timings}
+
+    @staticmethod
+    def export():
+        """
+        Calls the exporter with a snapshot, if one was given to enable().
+        """
+        Instrumentation._last_export = time.perf_counter()
+        if Instrumentation._exporter is not None:
+            Instrumentation._exporter(Instrumentation.snapshot())
+
+    @staticmethod
+    def _export_on_interval():
+        if Instrumentation._interval is not None and \
+                time.perf_counter() - Instrumentation._last_export >= Instrumentation._interval:
+            Instrumentation.export()
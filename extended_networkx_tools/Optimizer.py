@@ -0,0 +1,333 @@
+import math
+import time
+from typing import Callable, Dict, Iterable, List, Tuple, Union
+
+from networkx import nx
+import numpy as np
+
+try:
+    from Creator import Creator
+    from Analytics import Analytics
+    from AnalyticsGraph import AnalyticsGraph
+except ImportError:
+    from .Creator import Creator
+    from .Analytics import Analytics
+    from .AnalyticsGraph import AnalyticsGraph
+
+
+class Optimizer:
+    """
+    Local search over the edges of a graph, which moves one end of an edge at a time to minimize an objective
+    of the convergence rate and the edge cost. The number of edges stays the same. Supports hill climbing,
+    which only accepts moves that improve the objective, and simulated annealing.
+
+    The search works on an AnalyticsGraph, which keeps the edges, the adjacency matrix and the bridges of the
+    current graph up to date on each move. A networkx graph is only updated by apply(), while an AnalyticsGraph
+    that is given is changed by the search itself. Node ids are expected to be 0 to n-1.
+
+    Moves are proposed in batches that are all scored at once against the current graph, see
+    AnalyticsGraph.evaluate_moves(). The batch is then walked through in order until a move is accepted, and
+    the moves after it are discarded. Since a rejected move doesn't change the graph, this accepts the same
+    moves as scoring one move at a time. The batch size follows the acceptance rate, so few scored moves are
+    discarded.
+
+    **Example usage**::
+
+        optimizer = Optimizer(g, objective=lambda rates, costs: rates + 1e-6 * costs, seed=1)
+        stats = optimizer.run('anneal', time_limit=60)
+        optimizer.apply()
+    """
+    _graph: Union[nx.Graph, AnalyticsGraph]
+    _analytics_graph: AnalyticsGraph
+    _objective: Callable[[np.ndarray, np.ndarray], np.ndarray]
+    _connected: bool
+    _rng: np.random.Generator
+
+    _dimension: int
+    _score: float
+
+    def __init__(self, graph: Union[nx.Graph, AnalyticsGraph],
+                 objective: Callable[[np.ndarray, np.ndarray], np.ndarray] = None,
+                 connected: bool = True, tol: float = 0, seed: Union[int, np.random.Generator] = None):
+        """
+        :param graph: The graph to optimize, either as a networkx graph or an AnalyticsGraph. Large AnalyticsGraphs
+                      should use sparse and warm_start, which a networkx graph gets when it has more than
+                      Analytics.dense_batch_limit nodes.
+        :param objective: Function of an array of convergence rates and an array of edge costs, that returns
+                          an array with the value to minimize for each. Plain arithmetic such as
+                          lambda rates, costs: rates + 1e-6 * costs works. Defaults to the convergence rate.
+        :param connected: Whether to skip moves that would split a component of the graph.
+        :param tol: Relative accuracy of the convergence rates of networkx graphs with more than
+                    Analytics.dense_batch_limit nodes, where 0 means machine precision. An AnalyticsGraph
+                    uses its own.
+        :param seed: Seed or numpy random Generator, for reproducible searches.
+        """
+        self._graph = graph
+        self._objective = objective if objective is not None else lambda rates, costs: rates
+        self._connected = connected
+        self._rng = np.random.default_rng(seed)
+
+        if isinstance(graph, AnalyticsGraph):
+            self._analytics_graph = graph
+        else:
+            # Small graphs are scored by batched dense eigenvalue calculations, large ones with an iterative
+            # solver warm-started from the eigenvector of the current graph
+            large = graph.number_of_nodes() > Analytics.dense_batch_limit
+            self._analytics_graph = AnalyticsGraph(graph, sparse=large, tol=tol, warm_start=large)
+        self._dimension = self._analytics_graph.get_dimension()
+        self._score = self._get_score()
+
+    def get_convergence_rate(self) -> float:
+        """
+        :return: The convergence rate of the current graph of the search.
+        """
+        return self._analytics_graph.get_convergence_rate()
+
+    def get_edge_cost(self) -> float:
+        """
+        :return: The edge cost of the current graph of the search.
+        """
+        return self._analytics_graph.get_edge_cost()
+
+    def get_objective(self) -> float:
+        """
+        :return: The objective value of the current graph of the search.
+        """
+        return self._score
+
+    def get_edges(self) -> np.ndarray:
+        """
+        :return: Array of shape (m, 2) with the edges of the current graph of the search, without self loops.
+        """
+        return self._analytics_graph.get_edges()
+
+    def change_edges(self, removed: List[Tuple[int, int]], added: List[Tuple[int, int]]):
+        """
+        Removes and adds edges in the current graph of the search, such as to continue the search from
+        another graph, and calculates its convergence rate and edge cost again.
+
+        :param removed: The edges to remove, which must exist.
+        :param added: The edges to add, which must not exist.
+        """
+        for origin, destination in removed:
+            self._analytics_graph.remove_edge(origin, destination)
+        for origin, destination in added:
+            self._analytics_graph.add_edge(origin, destination)
+        self._score = self._get_score()
+
+    def run(self, method: str = 'anneal', max_iterations: int = None, time_limit: float = None,
+            temperature: Tuple[float, float] = None, batch_size: int = None,
+            restore_best: bool = True) -> Dict[str, Union[str, int, float, np.ndarray]]:
+        """
+        Runs the search until one of the budgets is used up, and leaves the search at the best graph found.
+        Call apply() afterwards to update the graph.
+
+        :param method: Either 'hill_climb', which only accepts moves that improve the objective, or 'anneal'
+                       for simulated annealing.
+        :param max_iterations: The largest number of moves to try.
+        :param time_limit: The largest number of seconds to search for.
+        :param temperature: The start and end temperature of the annealing, which is lowered geometrically
+                            over the budget. Defaults to a start temperature where about half of the moves
+                            that make the objective worse are accepted, and an end temperature 1000 times lower.
+        :param batch_size: The number of moves to score at once. Defaults to following the acceptance rate.
+        :param restore_best: Whether to go back to the best graph at the end. Otherwise the search stays
+                             at its current graph, and the edges of the best graph are returned as best_edges.
+        :return: Statistics of the search, such as the number of moves tried and accepted, the number of
+                 scored moves per second and the final objective.
+        """
+        if max_iterations is None and time_limit is None:
+            raise ValueError('At least one parameter of max_iterations or time_limit needs to be provided')
+        if method not in ('hill_climb', 'anneal'):
+            raise ValueError("method must be either 'hill_climb' or 'anneal'")
+
+        start_time = time.perf_counter()
+        if method == 'anneal' and temperature is None:
+            temperature = self.calibrate_temperature()
+        start_temperature, end_temperature = temperature if method == 'anneal' else (0, 0)
+
+        stats = {
+            'method': method,
+            'iterations': 0,
+            'evaluations': 0,
+            'accepted': 0,
+            'initial_objective': self._score,
+        }
+        best_score = self._score
+        best_state = (self.get_convergence_rate(), self.get_edge_cost())
+        # The moves accepted since the best graph, which are undone at the end
+        since_best = []
+
+        acceptance_rate = 0.5
+        elapsed = 0
+        while True:
+            elapsed = time.perf_counter() - start_time
+            progress = max(
+                stats['iterations'] / max_iterations if max_iterations is not None else 0,
+                elapsed / time_limit if time_limit is not None else 0
+            )
+            if progress >= 1:
+                break
+
+            count = batch_size if batch_size is not None else min(64, max(1, int(1 / acceptance_rate)))
+            if max_iterations is not None:
+                count = min(count, max_iterations - stats['iterations'])
+            moves = self._propose(count)
+            if len(moves) == 0:
+                break
+            convergence_rates, edge_costs, scores = self._evaluate(moves)
+            stats['evaluations'] += len(moves)
+
+            # Walk through the moves in order until one is accepted
+            deltas = scores - self._score
+            if start_temperature > 0:
+                current_temperature = start_temperature * (end_temperature / start_temperature) ** progress
+                with np.errstate(over='ignore'):
+                    accepted = (deltas <= 0) | (self._rng.random(len(moves)) < np.exp(-deltas / current_temperature))
+            else:
+                accepted = deltas < 0
+            if not accepted.any():
+                stats['iterations'] += len(moves)
+                acceptance_rate = max(0.9 * acceptance_rate, 1 / 64)
+                continue
+
+            index = int(np.argmax(accepted))
+            stats['iterations'] += index + 1
+            stats['accepted'] += 1
+            acceptance_rate = 0.9 * acceptance_rate + 0.1 / (index + 1)
+            # The move was scored by evaluate_moves(), so its convergence rate and eigenvector are kept
+            self._analytics_graph.move_edge(*moves[index])
+            self._score = float(scores[index])
+
+            since_best.append(moves[index])
+            if self._score < best_score:
+                best_score = self._score
+                best_state = (float(convergence_rates[index]), edge_costs[index])
+                since_best = []
+
+        if restore_best:
+            # Go back to the best graph, whose convergence rate is calculated again from the current eigenvector
+            for origin, old_destination, new_destination in reversed(since_best):
+                self._analytics_graph.move_edge(origin, new_destination, old_destination)
+            if len(since_best) > 0:
+                self._score = self._get_score()
+        else:
+            best_edges = {(origin, destination) for origin, destination in self.get_edges().tolist()}
+            for origin, old_destination, new_destination in reversed(since_best):
+                best_edges.discard((min(origin, new_destination), max(origin, new_destination)))
+                best_edges.add((min(origin, old_destination), max(origin, old_destination)))
+            stats['best_objective'] = best_score
+            stats['best_convergence_rate'] = best_state[0]
+            stats['best_edge_cost'] = best_state[1]
+            stats['best_edges'] = np.array(sorted(best_edges), dtype=np.intp).reshape(-1, 2)
+
+        stats['elapsed'] = elapsed
+        stats['moves_per_second'] = stats['evaluations'] / elapsed if elapsed > 0 else 0
+        stats['objective'] = self._score
+        stats['convergence_rate'] = self.get_convergence_rate()
+        stats['edge_cost'] = self.get_edge_cost()
+        return stats
+
+    def apply(self):
+        """
+        Changes the edges of a networkx graph to the current graph of the search. An AnalyticsGraph is already
+        changed by the search, where this only brings its networkx graph up to date.
+        """
+        self._analytics_graph.graph()
+
+    @staticmethod
+    def set_graph_edges(graph: Union[nx.Graph, AnalyticsGraph], edges: Iterable[Tuple[int, int]]):
+        """
+        Changes the edges of a graph to the given ones, by removing and adding only the edges that differ.
+        Self loops are kept as they are.
+
+        :param graph: The graph to change, either as a networkx graph or an AnalyticsGraph.
+        :param edges: The edges that the graph should have.
+        """
+        is_analytics_graph = isinstance(graph, AnalyticsGraph)
+        nxg = graph.graph() if is_analytics_graph else graph
+
+        edges = {(min(origin, destination), max(origin, destination)) for origin, destination in edges}
+        removed = [
+            (origin, destination) for origin, destination in nxg.edges()
+            if origin != destination and (min(origin, destination), max(origin, destination)) not in edges
+        ]
+        added = [edge for edge in sorted(edges) if not nxg.has_edge(*edge)]
+
+        for origin, destination in removed:
+            if is_analytics_graph:
+                graph.remove_edge(origin, destination)
+            else:
+                nxg.remove_edge(origin, destination)
+        for origin, destination in added:
+            if is_analytics_graph:
+                graph.add_edge(origin, destination)
+            else:
+                Creator.add_weighted_edge(nxg, origin, destination)
+
+    def calibrate_temperature(self) -> Tuple[float, float]:
+        """
+        Scores a sample of moves to find a start temperature where about half of the moves that make the
+        objective worse are accepted.
+
+        :return: The start and end temperature.
+        """
+        moves = self._propose(32)
+        if len(moves) > 0:
+            _, _, scores = self._evaluate(moves)
+            deltas = scores - self._score
+            deltas = deltas[deltas > 0]
+            if len(deltas) > 0:
+                start_temperature = float(deltas.mean()) / math.log(2)
+                return start_temperature, start_temperature / 1000
+        return 0, 0
+
+    def _propose(self, count: int) -> List[Tuple[int, int, int]]:
+        """
+        Draws random moves of one end of an edge to a node it isn't connected to.
+
+        :param count: The number of moves to draw.
+        :return: List of moves as (origin, old_destination, new_destination). It can be shorter than count
+                 if few valid moves were found.
+        """
+        moves = []
+        analytics_graph = self._analytics_graph
+        # Each edge has one end at each of its nodes, so picking a node by its degree and then one of its
+        # neighbours picks a random end of a random edge
+        edge_ends = np.cumsum(analytics_graph.get_degrees())
+        if self._dimension < 3 or edge_ends[-1] == 0:
+            return moves
+
+        for _ in range(10):
+            origins = np.searchsorted(edge_ends, self._rng.integers(0, edge_ends[-1], count), side='right').tolist()
+            picks = self._rng.random(count).tolist()
+            new_destinations = self._rng.integers(0, self._dimension, count).tolist()
+            for origin, pick, new_destination in zip(origins, picks, new_destinations):
+                if new_destination == origin or analytics_graph.has_edge(origin, new_destination):
+                    continue
+                neighbours = [neighbour for neighbour in analytics_graph.get_neighbours(origin) if neighbour != origin]
+                old_destination = neighbours[int(pick * len(neighbours))]
+                if self._connected and analytics_graph.would_disconnect(origin, old_destination, new_destination):
+                    continue
+                moves.append((origin, old_destination, new_destination))
+                if len(moves) == count:
+                    return moves
+        return moves
+
+    def _evaluate(self, moves: List[Tuple[int, int, int]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Scores moves against the current graph.
+
+        :param moves: List of valid moves as (origin, old_destination, new_destination).
+        :return: The convergence rate, the edge cost and the objective value after each move.
+        """
+        results = self._analytics_graph.evaluate_moves(moves)
+        convergence_rates = np.array([convergence_rate for convergence_rate, _ in results])
+        edge_costs = self.get_edge_cost() + np.array([edge_cost_delta for _, edge_cost_delta in results])
+        scores = np.asarray(self._objective(convergence_rates, edge_costs), dtype=float)
+        return convergence_rates, edge_costs, scores
+
+    def _get_score(self) -> float:
+        """
+        :return: The objective value of the current graph.
+        """
+        return float(self._objective(np.array([self.get_convergence_rate()]), np.array([self.get_edge_cost()]))[0])
@@ -0,0 +1,252 @@
+import multiprocessing
+import sys
+from multiprocessing.pool import Pool
+from typing import Dict, Iterator, List, Tuple, Union
+
+import numpy as np
+from scipy import sparse
+
+try:
+    from Analytics import Analytics
+    from AnalyticsGraph import AnalyticsGraph
+except ImportError:
+    from .Analytics import Analytics
+    from .AnalyticsGraph import AnalyticsGraph
+
+
+# The snapshot a worker process is currently attached to, see _attach_snapshot()
+_worker_snapshot: Dict = {'key': None}
+
+
+class ParallelEvaluator:
+    """
+    Scores candidate changes of an AnalyticsGraph in a pool of worker processes.
+
+    The adjacency matrix and node coordinates of the graph are published once through shared memory,
+    so the workers score candidates against that snapshot without the graph being pickled for each task.
+    Call publish() again after changing the graph. Requires Python 3.8 or later.
+
+    Each candidate is a tuple (origin, old_destination, new_destination), checked with
+    AnalyticsGraph.is_valid_move() and scored as in AnalyticsGraph.evaluate_moves(). An old_destination of None
+    scores adding the edge (origin, new_destination), and a new_destination of None scores removing the edge
+    (origin, old_destination).
+
+    **Example usage**::
+
+        with ParallelEvaluator(ag, workers=8) as evaluator:
+            scores = evaluator.evaluate([(1, 2, 5), (3, None, 7), (4, 6, None)])
+    """
+    _analytics_graph: AnalyticsGraph
+    _workers: int
+    _chunk_size: int
+    _tol: float
+    _pool: Union[Pool, None]
+    _shared_memory: List
+    _snapshot: Union[Dict, None]
+    _snapshot_count: int
+
+    def __init__(self, analytics_graph: AnalyticsGraph, workers: int = None, chunk_size: int = 16,
+                 tol: float = 0):
+        """
+        :param analytics_graph: The graph to score candidates for.
+        :param workers: The number of worker processes. Defaults to the number of CPUs.
+        :param chunk_size: The number of candidates sent to a worker in each task.
+        :param tol: Relative accuracy of the convergence rates for large graphs, where 0 means machine precision.
+        :raises RuntimeError: On Python versions before 3.8, which don't have multiprocessing.shared_memory.
+        """
+        if sys.version_info < (3, 8):
+            raise RuntimeError('ParallelEvaluator requires Python 3.8 or later for multiprocessing.shared_memory, '
+                               'but this is Python {}.{}'.format(*sys.version_info[:2]))
+        self._analytics_graph = analytics_graph
+        self._workers = workers if workers is not None else multiprocessing.cpu_count()
+        self._chunk_size = chunk_size
+        self._tol = tol
+        self._pool = None
+        self._shared_memory = []
+        self._snapshot = None
+        self._snapshot_count = 0
+
+    def __enter__(self) -> 'ParallelEvaluator':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def publish(self):
+        """
+        Publishes the current state of the graph to the workers. Has to be called after the graph
+        has been changed, otherwise the candidates are scored against the previous state.
+        """
+        adjacency_matrix = sparse.csr_matrix(self._analytics_graph.get_adjacency_matrix_sa(), dtype=float)
+        coordinates = Analytics.get_coordinate_array(self._analytics_graph.graph())
+
+        # Large graphs are scored with an iterative solver, which all workers start from this eigenvector
+        eigenvector = None
+        if adjacency_matrix.shape[0] > Analytics.dense_batch_limit:
+            _, eigenvector = Analytics.get_convergence_eigenpair(adjacency_matrix, tol=self._tol)
+
+        self._release_shared_memory()
+        self._snapshot_count += 1
+        self._snapshot = {
+            'key': (id(self), self._snapshot_count),
+            'tol': self._tol,
+            'dense_batch_limit': Analytics.dense_batch_limit,
+            'indptr': self._share(adjacency_matrix.indptr),
+            'indices': self._share(adjacency_matrix.indices),
+            'coordinates': self._share(coordinates),
+            'eigenvector': self._share(eigenvector) if eigenvector is not None else None,
+        }
+
+    def evaluate(self, candidates: List[Tuple[int, Union[int, None], Union[int, None]]]) \
+            -> List[Union[Tuple[float, int], None]]:
+        """
+        Scores all candidates in parallel.
+
+        :param candidates: List of candidates as (origin, old_destination, new_destination).
+        :return: A list with the convergence rate and the change in edge cost for each candidate, in the
+                 order of the candidates. Candidates that can't be applied to the graph are None.
+        """
+        results = [None] * len(candidates)
+        for index, result in self.evaluate_iter(candidates, ordered=False):
+            results[index] = result
+        return results
+
+    def evaluate_iter(self, candidates: List[Tuple[int, Union[int, None], Union[int, None]]],
+                      ordered: bool = True) -> Iterator[Tuple[int, Union[Tuple[float, int], None]]]:
+        """
+        Scores all candidates in parallel and yields the results as they are done.
+
+        :param candidates: List of candidates as (origin, old_destination, new_destination).
+        :param ordered: Whether to yield the results in the order of the candidates, rather than in the
+                        order they finish.
+        :return: An iterator of the index of each candidate and its result, see evaluate().
+        """
+        if self._snapshot is None:
+            self.publish()
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self._workers)
+
+        tasks = (
+            (self._snapshot, list(enumerate(candidates[start:start + self._chunk_size], start)))
+            for start in range(0, len(candidates), self._chunk_size)
+        )
+        imap = self._pool.imap if ordered else self._pool.imap_unordered
+        for chunk in imap(_evaluate_chunk, tasks):
+            yield from chunk
+
+    def close(self):
+        """
+        Stops the worker processes and releases the shared memory.
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        self._release_shared_memory()
+        self._snapshot = None
+
+    def _share(self, array: np.ndarray) -> Tuple[str, Tuple[int, ...], str]:
+        """
+        Copies an array to a new block of shared memory.
+
+        :param array: The array to share.
+        :return: The name of the shared memory block, and the shape and dtype of the array.
+        """
+        from multiprocessing import shared_memory
+
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+        self._shared_memory.append(block)
+        return block.name, array.shape, array.dtype.str
+
+    def _release_shared_memory(self):
+        for block in self._shared_memory:
+            block.close()
+            block.unlink()
+        self._shared_memory = []
+
+
+def _attach_snapshot(snapshot: Dict) -> Dict:
+    """
+    Attaches the worker process to the shared memory of a snapshot, unless it already is.
+
+    :param snapshot: The snapshot description created by ParallelEvaluator.publish().
+    :return: The arrays of the snapshot.
+    """
+    from multiprocessing import shared_memory
+
+    if _worker_snapshot['key'] == snapshot['key']:
+        return _worker_snapshot
+
+    for block in _worker_snapshot.get('blocks', []):
+        block.close()
+    _worker_snapshot.clear()
+
+    blocks = []
+    arrays = {}
+    for name in ('indptr', 'indices', 'coordinates', 'eigenvector'):
+        if snapshot[name] is None:
+            arrays[name] = None
+            continue
+        block_name, shape, dtype = snapshot[name]
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype, buffer=block.buf)
+
+    dimension = len(arrays['indptr']) - 1
+    _worker_snapshot.update(arrays)
+    _worker_snapshot['adjacency_matrix'] = sparse.csr_matrix(
+        (np.ones(len(arrays['indices'])), arrays['indices'], arrays['indptr']), shape=(dimension, dimension)
+    )
+    _worker_snapshot['blocks'] = blocks
+    _worker_snapshot['key'] = snapshot['key']
+    return _worker_snapshot
+
+
+def _evaluate_chunk(task: Tuple[Dict, List[Tuple[int, Tuple]]]) -> List[Tuple[int, Union[Tuple[float, int], None]]]:
+    """
+    Scores a chunk of candidates in a worker process.
+
+    :param task: The snapshot description and the chunk of indexed candidates.
+    :return: The index and result of each candidate.
+    """
+    snapshot, chunk = task
+    arrays = _attach_snapshot(snapshot)
+    # Workers started by spawn don't inherit a changed limit, which has to match the eigenvector in the snapshot
+    Analytics.dense_batch_limit = snapshot['dense_batch_limit']
+    indptr, indices, coordinates = arrays['indptr'], arrays['indices'], arrays['coordinates']
+
+    def has_edge(origin, destination):
+        return origin != destination and destination in indices[indptr[origin]:indptr[origin + 1]]
+
+    valid, removed, added = [], [], []
+    for index, (origin, old_destination, new_destination) in chunk:
+        if not AnalyticsGraph.is_valid_move(has_edge, origin, old_destination, new_destination):
+            continue
+        valid.append(index)
+        removed.append((origin, old_destination) if old_destination is not None else (-1, -1))
+        added.append((origin, new_destination) if new_destination is not None else (-1, -1))
+
+    results = [(index, None) for index, _ in chunk]
+    if len(valid) == 0:
+        return results
+
+    removed = np.array(removed, dtype=np.intp)
+    added = np.array(added, dtype=np.intp)
+    convergence_rates = Analytics.get_changed_convergence_rates(
+        arrays['adjacency_matrix'], removed, added, x0=arrays['eigenvector'], tol=snapshot['tol']
+    )
+
+    # Edge costs are the squared distances between the nodes, where no edge costs nothing
+    def weights(edges):
+        squared_distances = ((coordinates[edges[:, 0]] - coordinates[edges[:, 1]]) ** 2).sum(axis=1)
+        return np.where(edges[:, 0] >= 0, squared_distances, 0)
+
+    edge_cost_deltas = weights(added) - weights(removed)
+
+    offset = chunk[0][0]
+    for index, convergence_rate, edge_cost_delta in zip(valid, convergence_rates.tolist(),
+                                                        edge_cost_deltas.tolist()):
+        results[index - offset] = (index, (convergence_rate, edge_cost_delta))
+    return results
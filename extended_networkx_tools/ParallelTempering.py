@@ -0,0 +1,354 @@
+import math
+import multiprocessing
+import time
+from multiprocessing.connection import Connection
+from typing import Callable, Dict, List, Set, Tuple, Union
+
+from networkx import nx
+import numpy as np
+
+try:
+    from Creator import Creator
+    from Analytics import Analytics
+    from AnalyticsGraph import AnalyticsGraph
+    from Optimizer import Optimizer
+except ImportError:
+    from .Creator import Creator
+    from .Analytics import Analytics
+    from .AnalyticsGraph import AnalyticsGraph
+    from .Optimizer import Optimizer
+
+
+class ParallelTempering:
+    """
+    Runs several replicas of an Optimizer search in parallel, one process each, and combines them.
+
+    The replicas search in rounds of a fixed number of moves. With method 'tempering', each replica anneals at
+    its own fixed temperature from a geometric ladder, and after each round neighbouring temperatures are
+    exchanged with the usual replica exchange rule, so good graphs drift to the cold replicas while the hot
+    ones keep exploring. Exchanging the temperatures has the same effect as exchanging the graphs, without
+    moving any edges. With method 'multi_start', all replicas follow the same cooling schedule from their
+    own seeds, and can periodically restart the worst replica from the best current graph.
+
+    Graphs are only sent between processes as the edges that differ from the last known state, never as
+    whole graphs. The results depend only on the seeds, unless a time limit ends the search.
+
+    **Example usage**::
+
+        with ParallelTempering(g, replicas=8, objective=objective, seeds=range(8)) as search:
+            result = search.run(max_iterations=100000)
+            search.apply()
+
+    The objective is sent to the worker processes, so it must be picklable on platforms that don't fork,
+    such as a function defined at module level rather than a lambda. Since each replica already has a core
+    of its own, limiting numpy to one thread per process (such as with OMP_NUM_THREADS=1) is usually faster.
+    """
+    _graph: Union[nx.Graph, AnalyticsGraph]
+    _method: str
+    _replica_count: int
+    _objective: Union[Callable[[np.ndarray, np.ndarray], np.ndarray], None]
+    _connected: bool
+    _temperatures: Union[Tuple[float, float], None]
+    _seeds: List[int]
+    _tol: float
+
+    _processes: List[multiprocessing.Process]
+    _connections: List[Connection]
+    _replica_edges: List[Set[Tuple[int, int]]]
+    _best: Union[Dict, None]
+
+    def __init__(self, graph: Union[nx.Graph, AnalyticsGraph], replicas: int = None, method: str = 'tempering',
+                 objective: Callable[[np.ndarray, np.ndarray], np.ndarray] = None, connected: bool = True,
+                 temperatures: Tuple[float, float] = None, seeds: List[int] = None, tol: float = 0):
+        """
+        :param graph: The graph to optimize, either as a networkx graph or an AnalyticsGraph.
+        :param replicas: The number of replicas, each in its own process. Defaults to the number of seeds,
+                         or else the number of CPUs.
+        :param method: Either 'tempering' or 'multi_start'.
+        :param objective: The objective to minimize, see Optimizer().
+        :param connected: Whether to skip moves that would split a component of the graph.
+        :param temperatures: The highest and lowest temperature. For 'tempering' these are the ends of the
+                             ladder, and for 'multi_start' the start and end of the cooling schedule. Defaults
+                             to the temperatures of Optimizer.run().
+        :param seeds: The seed of each replica. Defaults to 0 to replicas-1.
+        :param tol: Relative accuracy of the convergence rates of graphs with more than
+                    Analytics.dense_batch_limit nodes.
+        """
+        if method not in ('tempering', 'multi_start'):
+            raise ValueError("method must be either 'tempering' or 'multi_start'")
+        if replicas is None:
+            replicas = len(seeds) if seeds is not None else multiprocessing.cpu_count()
+        self._graph = graph
+        self._method = method
+        self._replica_count = replicas
+        self._objective = objective
+        self._connected = connected
+        self._temperatures = temperatures
+        self._seeds = list(seeds) if seeds is not None else list(range(replicas))
+        if len(self._seeds) != replicas:
+            raise ValueError('seeds must have one seed per replica')
+        self._tol = tol
+        self._processes = []
+        self._connections = []
+        self._replica_edges = []
+        self._best = None
+
+    def __enter__(self) -> 'ParallelTempering':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def run(self, max_iterations: int = None, time_limit: float = None, round_iterations: int = 500,
+            migrate: bool = False) -> Dict:
+        """
+        Runs the replicas until one of the budgets is used up.
+
+        :param max_iterations: The largest number of moves each replica tries.
+        :param time_limit: The largest number of seconds to search for.
+        :param round_iterations: The number of moves each replica tries between exchanges.
+        :param migrate: Whether the worst replica continues from the best current graph after each round,
+                        for method 'multi_start'.
+        :return: The best objective, convergence rate and edge cost found, the index of the replica that
+                 found it, and a list of statistics for each replica, such as its moves per second.
+        """
+        if max_iterations is None and time_limit is None:
+            raise ValueError('At least one parameter of max_iterations or time_limit needs to be provided')
+        start_time = time.perf_counter()
+        self._start()
+
+        rng = np.random.default_rng(self._seeds)
+        high, low = self._get_temperatures()
+        if self._method == 'tempering' and high > 0:
+            ladder = [high * (low / high) ** (index / max(1, self._replica_count - 1))
+                      for index in range(self._replica_count)]
+        else:
+            ladder = [high] * self._replica_count
+        # The position on the ladder of each replica
+        rungs = list(range(self._replica_count))
+
+        replica_stats = [{
+            'seed': seed, 'iterations': 0, 'evaluations': 0, 'accepted': 0, 'elapsed': 0,
+            'exchanges_tried': 0, 'exchanges_accepted': 0, 'migrations': 0,
+            'best_objective': self._best['objective'],
+        } for seed in self._seeds]
+        objectives = [0.0] * self._replica_count
+
+        iterations = 0
+        rounds = 0
+        while True:
+            progress = max(
+                iterations / max_iterations if max_iterations is not None else 0,
+                (time.perf_counter() - start_time) / time_limit if time_limit is not None else 0
+            )
+            if progress >= 1:
+                break
+            count = round_iterations
+            if max_iterations is not None:
+                count = min(count, max_iterations - iterations)
+            if self._method == 'multi_start' and high > 0:
+                ladder = [high * (low / high) ** progress] * self._replica_count
+
+            for replica, connection in enumerate(self._connections):
+                connection.send(('run', ladder[rungs[replica]], count))
+            for replica, connection in enumerate(self._connections):
+                stats, removed, added = connection.recv()
+                self._update_edges(replica, removed, added)
+                objectives[replica] = stats['objective']
+                self._record_round(replica, stats, replica_stats[replica])
+            iterations += count
+            rounds += 1
+
+            if self._method == 'tempering':
+                self._exchange(rng, rounds, rungs, ladder, objectives, replica_stats)
+            elif migrate and self._replica_count > 1:
+                self._migrate(objectives, replica_stats)
+
+        elapsed = time.perf_counter() - start_time
+        for replica, stats in enumerate(replica_stats):
+            stats['temperature'] = ladder[rungs[replica]]
+            stats['moves_per_second'] = stats['evaluations'] / stats['elapsed'] if stats['elapsed'] > 0 else 0
+
+        return {
+            'objective': self._best['objective'],
+            'convergence_rate': self._best['convergence_rate'],
+            'edge_cost': self._best['edge_cost'],
+            'replica': self._best['replica'],
+            'rounds': rounds,
+            'elapsed': elapsed,
+            'moves_per_second': sum(stats['evaluations'] for stats in replica_stats) / elapsed if elapsed > 0 else 0,
+            'replicas': replica_stats,
+        }
+
+    def apply(self):
+        """
+        Changes the edges of the graph to the best graph found by any replica.
+        """
+        if self._best is not None:
+            Optimizer.set_graph_edges(self._graph, self._best['edges'].tolist())
+
+    def close(self):
+        """
+        Stops the replica processes.
+        """
+        for connection in self._connections:
+            connection.send(('stop',))
+            connection.close()
+        for process in self._processes:
+            process.join()
+        self._processes = []
+        self._connections = []
+
+    def _start(self):
+        """
+        Starts a process for each replica, unless they are already running.
+        """
+        if len(self._processes) > 0:
+            return
+        nxg = self._graph.graph() if isinstance(self._graph, AnalyticsGraph) else self._graph
+        coordinates = Analytics.get_coordinate_array(nxg)
+        edges = Analytics.get_edge_array(nxg)
+        edges = edges[edges[:, 0] != edges[:, 1]]
+        initial = {(min(origin, destination), max(origin, destination)) for origin, destination in edges.tolist()}
+
+        for seed in self._seeds:
+            connection, child_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_run_replica,
+                args=(child_connection, coordinates, edges, self._objective, self._connected, self._tol, seed),
+                daemon=True
+            )
+            process.start()
+            child_connection.close()
+            self._processes.append(process)
+            self._connections.append(connection)
+            self._replica_edges.append(set(initial))
+
+        # Start from the initial graph as the best one, which the replicas only report graphs better than
+        for connection in self._connections:
+            objective, convergence_rate, edge_cost = connection.recv()
+        if self._best is None:
+            self._best = {
+                'objective': objective,
+                'convergence_rate': convergence_rate,
+                'edge_cost': edge_cost,
+                'replica': None,
+                'edges': edges,
+            }
+
+    def _get_temperatures(self) -> Tuple[float, float]:
+        """
+        :return: The highest and lowest temperature, calibrated on the graph unless given.
+        """
+        if self._temperatures is not None:
+            return self._temperatures
+        if self._best['edges'].size == 0:
+            return 0, 0
+        self._connections[0].send(('calibrate',))
+        return self._connections[0].recv()
+
+    def _update_edges(self, replica: int, removed: List[Tuple[int, int]], added: List[Tuple[int, int]]):
+        edges = self._replica_edges[replica]
+        edges.difference_update(removed)
+        edges.update(added)
+
+    def _record_round(self, replica: int, stats: Dict, replica_stats: Dict):
+        """
+        Adds the statistics of a round to the totals of a replica, and keeps the best graph found.
+        """
+        for key in ('iterations', 'evaluations', 'accepted', 'elapsed'):
+            replica_stats[key] += stats[key]
+        if stats['best_edges'] is None:
+            return
+        replica_stats['best_objective'] = stats['best_objective']
+        # Ties go to the lowest replica, so the result doesn't depend on which process finishes first
+        if stats['best_objective'] < self._best['objective']:
+            self._best = {
+                'objective': stats['best_objective'],
+                'convergence_rate': stats['best_convergence_rate'],
+                'edge_cost': stats['best_edge_cost'],
+                'replica': replica,
+                'edges': stats['best_edges'],
+            }
+
+    def _exchange(self, rng: np.random.Generator, rounds: int, rungs: List[int], ladder: List[float],
+                  objectives: List[float], replica_stats: List[Dict]):
+        """
+        Tries to exchange the temperatures of the replicas on neighbouring rungs of the ladder, alternating
+        between the even and the odd pairs each round.
+        """
+        replica_on = {rung: replica for replica, rung in enumerate(rungs)}
+        for rung in range(rounds % 2, self._replica_count - 1, 2):
+            hot, cold = replica_on[rung], replica_on[rung + 1]
+            replica_stats[hot]['exchanges_tried'] += 1
+            replica_stats[cold]['exchanges_tried'] += 1
+            if ladder[rung] <= 0 or ladder[rung + 1] <= 0:
+                continue
+            exponent = (objectives[cold] - objectives[hot]) * (1 / ladder[rung + 1] - 1 / ladder[rung])
+            if exponent >= 0 or rng.random() < math.exp(exponent):
+                rungs[hot], rungs[cold] = rung + 1, rung
+                replica_stats[hot]['exchanges_accepted'] += 1
+                replica_stats[cold]['exchanges_accepted'] += 1
+
+    def _migrate(self, objectives: List[float], replica_stats: List[Dict]):
+        """
+        Sends the current graph of the best replica to the worst one, as the edges that differ.
+        """
+        best = int(np.argmin(objectives))
+        worst = int(np.argmax(objectives))
+        if objectives[best] >= objectives[worst]:
+            return
+        removed = sorted(self._replica_edges[worst] - self._replica_edges[best])
+        added = sorted(self._replica_edges[best] - self._replica_edges[worst])
+        self._connections[worst].send(('change', removed, added))
+        objectives[worst] = self._connections[worst].recv()
+        self._update_edges(worst, removed, added)
+        replica_stats[worst]['migrations'] += 1
+
+
+def _run_replica(connection: Connection, coordinates: np.ndarray, edges: np.ndarray,
+                 objective: Callable[[np.ndarray, np.ndarray], np.ndarray], connected: bool, tol: float, seed: int):
+    """
+    Runs one replica in a worker process, following the commands of ParallelTempering.
+
+    :param connection: The connection to the main process.
+    :param coordinates: The coordinates of the nodes.
+    :param edges: The initial edges.
+    :param objective: See Optimizer().
+    :param connected: See Optimizer().
+    :param tol: See Optimizer().
+    :param seed: The seed of the replica.
+    """
+    optimizer = Optimizer(Creator.from_arrays(coordinates, edges), objective, connected, tol, seed)
+    reported = {(min(origin, destination), max(origin, destination)) for origin, destination in edges.tolist()}
+    best_objective = optimizer.get_objective()
+    connection.send((best_objective, optimizer.get_convergence_rate(), optimizer.get_edge_cost()))
+
+    while True:
+        command = connection.recv()
+        if command[0] == 'run':
+            _, temperature, iterations = command
+            stats = optimizer.run('anneal', max_iterations=iterations, temperature=(temperature, temperature),
+                                  restore_best=False)
+            # Report the edges that changed since the last round, and the best graph only if it's new
+            current = {(min(origin, destination), max(origin, destination))
+                       for origin, destination in optimizer.get_edges().tolist()}
+            removed = sorted(reported - current)
+            added = sorted(current - reported)
+            reported = current
+            if stats['best_objective'] < best_objective:
+                best_objective = stats['best_objective']
+            else:
+                stats['best_edges'] = None
+            connection.send((stats, removed, added))
+        elif command[0] == 'change':
+            _, removed, added = command
+            optimizer.change_edges(removed, added)
+            reported.difference_update(removed)
+            reported.update(added)
+            connection.send(optimizer.get_objective())
+        elif command[0] == 'calibrate':
+            connection.send(optimizer.calibrate_temperature())
+        else:
+            connection.close()
+            return
@@ -1,4 +1,7 @@
+from typing import Callable, Dict, Iterator, List, Tuple, Union
+
 import networkx
+import numpy as np
 try:
     from Creator import Creator
 except ImportError:
@@ -56,22 +59,150 @@ class Solver:
     def complete(nxg: networkx.Graph) -> networkx.Graph:
         """
         Makes a graph a complete graph, such as all nodes are connected to
-        each other with one edge.
+        each other with one edge. Edges that already exist are kept as they are.
+
+        The pairs of nodes and their weights are calculated in chunks with numpy,
+        and each chunk is added to the graph at once.
 
         :rtype: networkx.Graph
         :param nxg: A graph with nodes containing coordinates.
         :return: A complete graph.
         """
-        # Get the list of nodes.
+        # Get the list of nodes, in the order that the pairs are added.
+        nodes = list(nxg.nodes())
+        node_index = {node: index for index, node in enumerate(nodes)}
+        coordinates = Solver._get_coordinate_array(nxg, nodes)
+
+        # Identify the existing edges by their ordered pair of node indices, to skip them
+        existing = np.array(
+            [(node_index[origin], node_index[destination]) for origin, destination in nxg.edges()], dtype=np.int64
+        ).reshape(-1, 2)
+        existing = np.sort(existing.min(axis=1) * len(nodes) + existing.max(axis=1))
+
+        for origins, destinations, weights in Solver._get_complete_chunks(coordinates):
+            if len(existing) > 0:
+                new = ~np.isin(origins * len(nodes) + destinations, existing, assume_unique=True)
+                origins, destinations, weights = origins[new], destinations[new], weights[new]
+            nxg.add_edges_from(
+                (nodes[origin], nodes[destination], {'weight': weight})
+                for origin, destination, weight in zip(origins.tolist(), destinations.tolist(), weights.tolist())
+            )
+
+        return nxg
+
+    @staticmethod
+    def optimize(graph, method: str = 'anneal', objective: Callable[[np.ndarray, np.ndarray], np.ndarray] = None,
+                 max_iterations: int = None, time_limit: float = None, connected: bool = True,
+                 temperature: Tuple[float, float] = None, batch_size: int = None, tol: float = 0,
+                 seed: Union[int, np.random.Generator] = None) -> Dict[str, Union[str, int, float]]:
+        """
+        Moves the edges of a graph to minimize an objective of its convergence rate and edge cost, by hill
+        climbing or simulated annealing. The graph is changed in place to the best layout found.
+        See Optimizer for how the search works.
+
+        **Example usage**::
+
+            stats = Solver.optimize(g, objective=lambda rates, costs: rates + 1e-6 * costs, time_limit=60)
+            print(stats['moves_per_second'])
+
+        :param graph: The graph to optimize, either as a networkx graph or an AnalyticsGraph.
+        :type graph: Union[networkx.Graph, AnalyticsGraph]
+        :param method: Either 'hill_climb' or 'anneal'.
+        :param objective: Function of an array of convergence rates and an array of edge costs, that returns
+                          an array with the value to minimize for each. Defaults to the convergence rate.
+        :param max_iterations: The largest number of moves to try.
+        :param time_limit: The largest number of seconds to search for.
+        :param connected: Whether to skip moves that would split a component of the graph.
+        :param temperature: The start and end temperature of the annealing, see Optimizer.run().
+        :param batch_size: The number of moves to score at once. Defaults to following the acceptance rate.
+        :param tol: Relative accuracy of the convergence rates of networkx graphs with more than
+                    Analytics.dense_batch_limit nodes, see Optimizer().
+        :param seed: Seed or numpy random Generator, for reproducible searches.
+        :return: Statistics of the search, see Optimizer.run().
+        """
+        # Imported here since the optimizer depends on the heavier analytics modules
+        try:
+            from Optimizer import Optimizer
+        except ImportError:
+            from .Optimizer import Optimizer
+
+        optimizer = Optimizer(graph, objective, connected, tol, seed)
+        stats = optimizer.run(method, max_iterations, time_limit, temperature, batch_size)
+        optimizer.apply()
+        return stats
+
+    @staticmethod
+    def complete_weight_matrix(nxg: networkx.Graph) -> np.ndarray:
+        """
+        Calculates the weights of the complete graph without adding any edges, as an n x n matrix.
+        Rows and columns are in the order of the sorted node ids, as in Analytics.get_adjacency_matrix().
+
+        :param nxg: A graph with nodes containing coordinates.
+        :return: A symmetric matrix with the weight of the edge between each pair of nodes, and 0 on the diagonal.
+        """
+        coordinates = Solver._get_coordinate_array(nxg, sorted(nxg.nodes()))
+        delta_x = coordinates[:, 0, np.newaxis] - coordinates[np.newaxis, :, 0]
+        delta_y = coordinates[:, 1, np.newaxis] - coordinates[np.newaxis, :, 1]
+        return delta_x * delta_x + delta_y * delta_y
+
+    @staticmethod
+    def complete_edges(nxg: networkx.Graph, chunk_size: int = 2 ** 20) \
+            -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Calculates the edges of the complete graph without adding them, in chunks that each fit in
+        a bounded amount of memory. The edges come in the same order as Solver.complete() adds them.
+
+        **Example usage**::
+
+            for edges, weights in Solver.complete_edges(g):
+                total += weights.sum()
+
+        :param nxg: A graph with nodes containing coordinates.
+        :param chunk_size: The largest number of edges in each chunk, unless a single node has more.
+        :return: An iterator of chunks, each an array of shape (k, 2) with the node ids of the edges and
+                 an array with their weights.
+        """
         nodes = list(nxg.nodes())
-        # Iterate over the nodes as origin
-        for origin_id, origin_node in enumerate(nodes):
-            # Iterate over the nodes as destination
-            for dest_id, dest_node in enumerate(nodes):
-                # Discard the nodes that are lower or equal than the origin id
-                if dest_id <= origin_id:
-                    continue
-                # Add an edge between the nodes.
-                Creator.add_weighted_edge(nxg, origin_node, dest_node)
-
-        return nxg
\ No newline at end of file
+        node_ids = np.array(nodes)
+        coordinates = Solver._get_coordinate_array(nxg, nodes)
+        for origins, destinations, weights in Solver._get_complete_chunks(coordinates, chunk_size):
+            yield np.stack((node_ids[origins], node_ids[destinations]), axis=1), weights
+
+    @staticmethod
+    def _get_coordinate_array(nxg: networkx.Graph, nodes: List) -> np.ndarray:
+        """
+        :param nxg: A graph with nodes containing coordinates.
+        :param nodes: The nodes to get the coordinates of.
+        :return: An array of shape (n, 2) with the coordinates of each node.
+        """
+        return np.array([(nxg.node[node]['x'], nxg.node[node]['y']) for node in nodes]).reshape(-1, 2)
+
+    @staticmethod
+    def _get_complete_chunks(coordinates: np.ndarray, chunk_size: int = 2 ** 20) \
+            -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Generates all pairs of nodes i < j with the squared distance between them, ordered by i and then j.
+
+        :param coordinates: Array of shape (n, 2) with the coordinates of each node.
+        :param chunk_size: The number of pairs to calculate at a time.
+        :return: An iterator of chunks, each with an array of the first and the second node index of the
+                 pairs, and an array with the squared distances.
+        """
+        dimension = len(coordinates)
+        start = 0
+        while start < dimension - 1:
+            # Rows further down have fewer pairs, so take as many rows as fit in the chunk
+            end = start + 1
+            pair_count = dimension - 1 - start
+            while end < dimension - 1 and pair_count + dimension - 1 - end <= chunk_size:
+                pair_count += dimension - 1 - end
+                end += 1
+
+            # Only the pairs themselves are created, so the memory use is proportional to the chunk size
+            counts = dimension - 1 - np.arange(start, end)
+            origins = np.repeat(np.arange(start, end), counts)
+            row_starts = np.repeat(np.cumsum(counts) - counts, counts)
+            destinations = np.arange(pair_count) - row_starts + origins + 1
+            delta = coordinates[origins] - coordinates[destinations]
+            yield origins, destinations, delta[:, 0] * delta[:, 0] + delta[:, 1] * delta[:, 1]
+            start = end
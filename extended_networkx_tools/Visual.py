@@ -1,10 +1,10 @@
 import networkx as nx
-import matplotlib.pyplot as plt
 
 
 class Visual:
     """
     Static class that only helps in visualising graph information.
+    matplotlib is imported on the first call, since it is slow to import.
     """
 
     @staticmethod
@@ -33,6 +33,7 @@ class Visual:
         :param nx_graph: The networkx object to show the graph from.
         :type nx_graph: networkx.Graph
         """
+        import matplotlib.pyplot as plt
         Visual._draw(nx_graph)
         plt.show()
 
@@ -45,5 +46,6 @@ class Visual:
         :param nx_graph: The networkx object to show the graph from.
         :type nx_graph: networkx.Graph
         """
+        import matplotlib.pyplot as plt
         Visual._draw(nx_graph)
         plt.savefig(filename, format='png')
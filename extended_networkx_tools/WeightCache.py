@@ -0,0 +1,214 @@
+from typing import Dict, Iterable, Tuple, Union
+
+import networkx
+import numpy as np
+
+
+class WeightCache:
+    """
+    Precomputed edge weights of a graph, which are the squared distances between its nodes.
+    Node ids are expected to be 0 to n-1.
+
+    Graphs with up to dense_limit nodes keep all weights in one n x n array. Larger graphs are split into
+    square blocks of nodes, where the weights between two blocks are calculated the first time one of them
+    is read.
+
+    The cache is attached to a graph with attach(), after which Creator.add_weighted_edge(), and with it
+    Solver.path() and Solver.cycle(), reads the weights from it. Solver.complete() calculates the weights of all
+    pairs in vectorized chunks instead, which is faster than reading them one at a time.
+
+    Reads don't check the coordinates of the nodes, so call invalidate() after moving a node, or validate() to
+    find the nodes that have been moved.
+
+    **Example usage**::
+
+        weight_cache = WeightCache.attach(g)
+        Solver.cycle(g)  # Reads the weights of the edges from the cache
+    """
+    _nxg: networkx.Graph
+    _coordinates: np.ndarray
+    _dimension: int
+    _dense: Union[np.ndarray, None]
+    _dense_limit: int
+    _blocks: Dict[Tuple[int, int], np.ndarray]
+    _block_size: int
+
+    def __init__(self, nxg: networkx.Graph, dense_limit: int = 2000, block_size: int = 256):
+        """
+        :param nxg: The graph to cache the weights of.
+        :param dense_limit: The largest number of nodes to keep all weights in a single array for.
+        :param block_size: The number of nodes in each block, for graphs larger than dense_limit.
+        """
+        self._nxg = nxg
+        self._dimension = nxg.number_of_nodes()
+        self._coordinates = np.array(
+            [(nxg.node[node]['x'], nxg.node[node]['y']) for node in range(self._dimension)]
+        ).reshape(self._dimension, 2)
+        self._blocks = {}
+        self._block_size = block_size
+        self._dense_limit = dense_limit
+        if self._dimension <= dense_limit:
+            self._dense = WeightCache.squared_distances(self._coordinates, self._coordinates)
+        else:
+            self._dense = None
+
+    @staticmethod
+    def attach(nxg: networkx.Graph, dense_limit: int = 2000, block_size: int = 256) -> 'WeightCache':
+        """
+        Creates a weight cache for a graph and stores it in the graph attributes, where Creator finds it.
+
+        :param nxg: The graph to cache the weights of.
+        :param dense_limit: See WeightCache().
+        :param block_size: See WeightCache().
+        :return: The attached weight cache.
+        """
+        weight_cache = WeightCache(nxg, dense_limit, block_size)
+        nxg.graph['weight_cache'] = weight_cache
+        return weight_cache
+
+    @staticmethod
+    def get(nxg: networkx.Graph) -> Union['WeightCache', None]:
+        """
+        :param nxg: The graph to get the weight cache of.
+        :return: The weight cache attached to the graph, or None if there is none.
+        """
+        weight_cache = nxg.graph.get('weight_cache')
+        # Copies of a graph share its attributes, but not its nodes
+        if weight_cache is None or weight_cache._nxg is not nxg:
+            return None
+        return weight_cache
+
+    @staticmethod
+    def detach(nxg: networkx.Graph):
+        """
+        Removes the weight cache from the graph attributes, if there is one.
+
+        :param nxg: The graph to remove the weight cache from.
+        """
+        nxg.graph.pop('weight_cache', None)
+
+    @staticmethod
+    def squared_distances(origins: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+        """
+        Calculates the squared distance from each origin to each destination.
+
+        :param origins: Array of shape (a, 2) with coordinates.
+        :param destinations: Array of shape (b, 2) with coordinates.
+        :return: Array of shape (a, b) with the squared distances.
+        """
+        delta_x = origins[:, 0, np.newaxis] - destinations[np.newaxis, :, 0]
+        delta_y = origins[:, 1, np.newaxis] - destinations[np.newaxis, :, 1]
+        return delta_x * delta_x + delta_y * delta_y
+
+    def get_weight(self, origin: int, destination: int):
+        """
+        Returns the weight of an edge, without checking whether either node has been moved.
+
+        :param origin:
+        :param destination:
+        :return: The squared distance between the nodes.
+        """
+        if self._dense is not None:
+            return self._dense.item(origin, destination)
+        origin_block, origin_offset = divmod(origin, self._block_size)
+        destination_block, destination_offset = divmod(destination, self._block_size)
+        return self._get_block(origin_block, destination_block).item(origin_offset, destination_offset)
+
+    def get_weights(self, origins: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+        """
+        Returns the weights of many edges at once, without checking whether any node has been moved.
+
+        :param origins: Array with the first node of each edge.
+        :param destinations: Array with the second node of each edge.
+        :return: Array with the squared distance between the nodes of each edge.
+        """
+        if self._dense is not None:
+            return self._dense[origins, destinations]
+        delta = self._coordinates[origins] - self._coordinates[destinations]
+        return (delta * delta).sum(axis=-1)
+
+    def get_coordinates(self) -> np.ndarray:
+        """
+        :return: Array of shape (n, 2) with the cached coordinates of each node. Must not be modified.
+        """
+        return self._coordinates
+
+    def invalidate(self, node: int = None):
+        """
+        Reads the coordinates of a node from the graph again, and updates the weights of all edges from it.
+        Has to be called after a node has been moved, since reads don't check the coordinates. Without a node,
+        or for a node added to the graph after the cache was created, the whole cache is created again.
+
+        :param node: The node that has been moved.
+        """
+        if node is None or node >= self._dimension:
+            self.__init__(self._nxg, self._dense_limit, self._block_size)
+            return
+        attributes = self._nxg.node[node]
+        self._update_node(node, attributes['x'], attributes['y'])
+
+    def validate(self, nodes: Iterable[int] = None) -> int:
+        """
+        Compares the cached coordinates with the graph, and updates the weights of each node that has moved.
+        Nodes that are missing from the cache, such as nodes added to the graph after the cache was created,
+        cause the whole cache to be created again.
+
+        :param nodes: The nodes to check. Defaults to all nodes of the graph.
+        :return: The number of nodes that were updated.
+        """
+        if nodes is None:
+            nodes = range(self._nxg.number_of_nodes())
+        updated = 0
+        for node in nodes:
+            if node >= self._dimension:
+                self.__init__(self._nxg, self._dense_limit, self._block_size)
+                return self._dimension
+            attributes = self._nxg.node[node]
+            if attributes['x'] != self._coordinates.item(node, 0) or attributes['y'] != self._coordinates.item(node, 1):
+                self._update_node(node, attributes['x'], attributes['y'])
+                updated += 1
+        return updated
+
+    def _update_node(self, node: int, x, y):
+        """
+        Updates the coordinates of a node and the weights of all edges from it.
+
+        :param node:
+        :param x:
+        :param y:
+        """
+        # Moving a node to a float coordinate makes all weights floats
+        dtype = np.result_type(self._coordinates, x, y)
+        if dtype != self._coordinates.dtype:
+            self._coordinates = self._coordinates.astype(dtype)
+            if self._dense is not None:
+                self._dense = self._dense.astype(dtype)
+        self._coordinates[node] = (x, y)
+        if self._dense is not None:
+            weights = WeightCache.squared_distances(self._coordinates[node:node + 1], self._coordinates)[0]
+            self._dense[node, :] = weights
+            self._dense[:, node] = weights
+        else:
+            node_block = node // self._block_size
+            for key in [key for key in self._blocks if node_block in key]:
+                del self._blocks[key]
+
+    def _get_block(self, origin_block: int, destination_block: int) -> np.ndarray:
+        """
+        Returns the weights between two blocks of nodes, which are calculated on the first call.
+
+        :param origin_block:
+        :param destination_block:
+        :return: Array with the squared distances from each node in the first block to each node in the second.
+        """
+        block = self._blocks.get((origin_block, destination_block))
+        if block is None:
+            origins = self._coordinates[origin_block * self._block_size:(origin_block + 1) * self._block_size]
+            destinations = self._coordinates[
+                destination_block * self._block_size:(destination_block + 1) * self._block_size
+            ]
+            block = WeightCache.squared_distances(origins, destinations)
+            self._blocks[(origin_block, destination_block)] = block
+            # The weights are symmetrical, so the mirrored block is its transpose
+            self._blocks[(destination_block, origin_block)] = block.T
+        return block
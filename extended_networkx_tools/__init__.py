@@ -1,5 +1,50 @@
-from .Creator import Creator
-from .Visual import Visual
-from .Analytics import Analytics
-from .Solver import Solver
-from .AnalyticsGraph import AnalyticsGraph
\ No newline at end of file
+import importlib
+import sys
+import types
+
+# The module of each class in the package, which is only imported when the class is first used, since
+# some of them import slow dependencies such as scipy
+_modules = {
+    'Creator': '.Creator',
+    'Visual': '.Visual',
+    'Analytics': '.Analytics',
+    'Solver': '.Solver',
+    'AnalyticsGraph': '.AnalyticsGraph',
+    'ParallelEvaluator': '.ParallelEvaluator',
+    'WeightCache': '.WeightCache',
+    'Optimizer': '.Optimizer',
+    'ParallelTempering': '.ParallelTempering',
+    'Instrumentation': '.Instrumentation',
+    'GraphFile': '.GraphFile',
+    'BatchAnalytics': '.BatchAnalytics',
+}
+
+__all__ = list(_modules)
+
+
+class _Package(types.ModuleType):
+    def __setattr__(self, name, value):
+        # Importing a submodule sets it as an attribute of the package, which would hide the class of the same
+        # name, so set the class instead
+        if name in _modules and isinstance(value, types.ModuleType):
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
+
+
+def __getattr__(name: str):
+    if name not in _modules:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    return getattr(importlib.import_module(_modules[name], __name__), name)
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_modules))
+
+
+if sys.version_info < (3, 7):
+    # Module level __getattr__ requires Python 3.7 (PEP 562)
+    for _name in _modules:
+        __getattr__(_name)
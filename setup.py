@@ -30,8 +30,14 @@ setup(name='extended_networkx_tools',
             'numba',
             'pyparsing',
             'python-dateutil',
+            'scipy',
       ],
       py_modules=['six'],
+      entry_points={
+            'console_scripts': [
+                  'extended-networkx-analytics=extended_networkx_tools.BatchAnalytics:main',
+            ],
+      },
       python_requires='~=3.6',
       zip_safe=False,
       classifiers=[